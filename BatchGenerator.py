@@ -0,0 +1,102 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+
+import gc
+import time
+import multiprocessing
+from ConfigModel import ConfigModel
+from ConfigGenerator import ConfigGenerator
+from Profiler import Profiler
+
+# BatchGenerator and sites of the worker process. They are handed to the pool
+# initializer, which the forked workers inherit together with the imported
+# generators and compiled templates, so nothing but the results needs to be
+# pickled.
+_forkbatch = None
+
+def _initforkworker(batch, sites):
+	global _forkbatch
+	_forkbatch = (batch, sites)
+
+def _runforksite(index):
+	(batch, sites) = _forkbatch
+	return batch.runsite(*sites[index])
+
+class BatchGenerator():
+	"""Generates the configurations of many sites, each given by an input XML
+	file and its own output directory. Generators are imported and their
+	templates compiled once up front; the sites are then processed by forked
+	worker processes that inherit them, so that the per-site cost is only
+	loading the configuration and rendering its outputs. A failing site does
+	not affect the others.
+
+		batch = BatchGenerator("generators/", jobs = 8)
+		for (infile, outdir, error, outputs, elapsed) in batch.run(sites):
+			...
+	"""
+
+	def __init__(self, gendir = "generators/", generators = None, jobs = 1, durable = False):
+		self._configgenerator = ConfigGenerator(gendir)
+		self._generators = self._configgenerator.getregistry().select(generators)
+		self._jobs = jobs
+		self._durable = durable
+		self._configgenerator.preload(self._generators)
+
+	def runsite(self, infile, outdir):
+		"""Generates a single site in the current process and returns a tuple
+		(infile, outdir, error, outputs, elapsed). error is None on success or
+		the error message, outputs the number of created outputs and elapsed
+		the wall clock time in seconds."""
+		from Output import DirectoryOutput
+
+		t0 = time.perf_counter()
+		profiler = Profiler()
+		try:
+			model = ConfigModel.fromfile(infile)
+			output = DirectoryOutput(outdir, durable = self._durable)
+			try:
+				self._configgenerator.generate(model, output, self._generators, profiler = profiler)
+			finally:
+				output.close()
+		except Exception as e:
+			return (infile, outdir, "%s: %s" % (e.__class__.__name__, str(e)), 0, time.perf_counter() - t0)
+		return (infile, outdir, None, profiler.getreport()["counts"].get("outputs", 0), time.perf_counter() - t0)
+
+	def run(self, sites):
+		"""Generates the given (infile, outdir) sites and yields the result of
+		every site (see runsite()) as soon as it is done, i.e. not necessarily
+		in the order of sites. Without fork support or with a single job, the
+		sites are generated one after the other in this process."""
+		sites = list(sites)
+		if (self._jobs <= 1) or (len(sites) <= 1) or ("fork" not in multiprocessing.get_all_start_methods()):
+			for (infile, outdir) in sites:
+				yield self.runsite(infile, outdir)
+			return
+
+		try:
+			# Keep the collector from touching (and thereby copying) the
+			# inherited generators and templates in every worker
+			gc.freeze()
+			with multiprocessing.get_context("fork").Pool(min(self._jobs, len(sites)), _initforkworker, (self, sites)) as pool:
+				yield from pool.imap_unordered(_runforksite, range(len(sites)))
+		finally:
+			gc.unfreeze()
@@ -0,0 +1,154 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+from ConfigModel import ConfigModel
+
+class ConfigDiff():
+	"""Semantic difference between two configurations. Hosts are matched by
+	their fully qualified name, networks by their name; both sides are sorted
+	by that key and merged in a single pass. Every difference is a tuple
+	(kind, action, name, details) with kind "host" or "network", action
+	"added", "removed" or "modified" and, for modifications, details being a
+	list of (field, old, new) string tuples.
+
+		diff = ConfigDiff.fromfiles("old.xml", "new.xml")
+		for (kind, action, name, details) in diff.getchanges():
+			...
+	"""
+
+	def __init__(self, oldmodel, newmodel):
+		self._oldmodel = oldmodel
+		self._newmodel = newmodel
+		self._changes = [ ]
+		self._compare("network", oldmodel.getnetworks(), newmodel.getnetworks(), lambda network: network.getname(), self._networkfields)
+		self._compare("host", oldmodel.gethosts(), newmodel.gethosts(), lambda host: (host.getnetwork().getname(), host.getname()), self._hostfields)
+
+	@classmethod
+	def fromfiles(cls, oldfilename, newfilename):
+		return cls(ConfigModel.fromfile(oldfilename), ConfigModel.fromfile(newfilename))
+
+	@staticmethod
+	def _merge(oldobjs, newobjs, key):
+		"""Yields (key, old, new) for the union of both collections, ordered by
+		key; old or new is None for objects that exist on one side only."""
+		oldobjs = sorted((key(obj), obj) for obj in oldobjs)
+		newobjs = sorted((key(obj), obj) for obj in newobjs)
+		(i, j) = (0, 0)
+		while (i < len(oldobjs)) or (j < len(newobjs)):
+			if (j >= len(newobjs)) or ((i < len(oldobjs)) and (oldobjs[i][0] < newobjs[j][0])):
+				yield (oldobjs[i][0], oldobjs[i][1], None)
+				i += 1
+			elif (i >= len(oldobjs)) or (newobjs[j][0] < oldobjs[i][0]):
+				yield (newobjs[j][0], None, newobjs[j][1])
+				j += 1
+			else:
+				yield (oldobjs[i][0], oldobjs[i][1], newobjs[j][1])
+				i += 1
+				j += 1
+
+	@staticmethod
+	def _keystr(key):
+		return key if isinstance(key, str) else "%s.%s" % (key[1], key[0])
+
+	def _compare(self, kind, oldobjs, newobjs, key, fields):
+		for (objkey, old, new) in self._merge(oldobjs, newobjs, key):
+			name = self._keystr(objkey)
+			if old is None:
+				self._changes.append((kind, "added", name, [ ]))
+			elif new is None:
+				self._changes.append((kind, "removed", name, [ ]))
+			elif old.getfingerprint() != new.getfingerprint():
+				(oldfields, newfields) = (fields(old), fields(new))
+				details = [ (field, oldfields.get(field, ""), newfields.get(field, "")) for field in sorted(set(oldfields) | set(newfields)) if oldfields.get(field) != newfields.get(field) ]
+				if len(details) > 0:
+					self._changes.append((kind, "modified", name, details))
+
+	@staticmethod
+	def _hostfields(host):
+		fields = {
+			"ip":		str(host.getip()),
+			"mac":		str(host.getmac()),
+			"tags":		",".join(sorted(host.gettags())),
+			"group":	host.getgroup() or "",
+		}
+		dns = host.getdns()
+		if dns is not None:
+			if dns.hashinfo():
+				fields["dns hinfo"] = "%s %s" % (dns.hinfoarch(), dns.hinfoos())
+			fields["dns txt"] = ", ".join(dns.gettext())
+			fields["dns cname"] = ", ".join(dns.getcnames())
+		return { field: value for (field, value) in fields.items() if value != "" }
+
+	@staticmethod
+	def _networkfields(network):
+		fields = {
+			"subnet":		str(network.getnet()),
+		}
+		if network.hasdhcp():
+			dhcp = network.getdhcp()
+			ipstr = lambda ip: str(ip) if (ip is not None) else ""
+			fields.update({
+				"dhcp range":		"%s - %s" % (dhcp.getrangefrom(), dhcp.getrangeto()),
+				"dhcp broadcast":	ipstr(dhcp.getbroadcast()),
+				"dhcp dnsserver":	", ".join(str(ip) for ip in dhcp.getdnsservers()),
+				"dhcp router":		ipstr(dhcp.getrouter()),
+				"dhcp ntpserver":	", ".join(str(ip) for ip in dhcp.getntpservers()),
+				"dhcp leasetime":	"%s/%s" % (dhcp.getleasetimedefault(), dhcp.getleasetimemax()) if (dhcp.getleasetimedefault() is not None) else "",
+				"dhcp pxe":			"%s from %s" % (dhcp.getpxefilename(), dhcp.getpxenext()) if (dhcp.getpxefilename() is not None) else "",
+			})
+		if network.hasdns():
+			fields["dns authority"] = str(network.getdns().getauthority())
+		return { field: value for (field, value) in fields.items() if value != "" }
+
+	def getchanges(self):
+		return self._changes
+
+	def isempty(self):
+		return len(self._changes) == 0
+
+	def getoutputchanges(self, configgenerator, generators = None):
+		"""Determines which outputs of the given generators (names, default
+		all of them) would change, without rendering any of them. Returns a
+		list of (action, destfilename) tuples ordered by filename with action
+		being "added", "removed", "modified" or "unknown". Outputs without
+		fingerprint cover the whole configuration and are "unknown" whenever
+		anything changed."""
+		from Output import PlanOutput
+
+		fingerprints = [ ]
+		for model in [ self._oldmodel, self._newmodel ]:
+			output = PlanOutput()
+			configgenerator.generate(model, output, generators)
+			fingerprints.append(output.getfingerprints())
+		(oldprints, newprints) = fingerprints
+
+		changes = [ ]
+		for destfilename in sorted(set(oldprints) | set(newprints)):
+			if destfilename not in oldprints:
+				changes.append(("added", destfilename))
+			elif destfilename not in newprints:
+				changes.append(("removed", destfilename))
+			elif (oldprints[destfilename] is None) or (newprints[destfilename] is None):
+				if not self.isempty():
+					changes.append(("unknown", destfilename))
+			elif oldprints[destfilename] != newprints[destfilename]:
+				changes.append(("modified", destfilename))
+		return changes
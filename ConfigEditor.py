@@ -0,0 +1,292 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import contextlib
+from XMLParser import XMLParser, XMLNode
+from ConfigModel import ConfigModel
+from ConfigIndex import ConfigIndex
+from Representation import Host
+from IPv4 import IPv4Addr
+from Ethernet import MacAddress
+from IPAllocator import IPAllocator
+
+class ConfigEditor():
+	"""Edits the hosts of a parsed configuration. Every change is validated
+	immediately against indexes of names, IP and MAC addresses, so an invalid
+	change raises an exception and leaves the configuration untouched. Within
+	a transaction, all changes are undone if any exception escapes it. The
+	result is written back in a single pass over the XML tree.
+
+		editor = ConfigEditor.fromfile("config.xml")
+		with editor.transaction():
+			editor.addhost("web1", "02:00:00:00:00:01", network = "homelan.net")
+			editor.movehost("maeh.homelan.net", "wlan.net")
+			editor.removehost("muhlaptop.wlan.net")
+		editor.writefile("config.xml")
+	"""
+	_WRITEBUFSIZE = 1024 * 1024
+
+	def __init__(self, xml):
+		self._xml = xml
+		model = ConfigModel(xml)
+		self._index = ConfigIndex(model)
+		self._hostsnode = xml.hosts
+		# (networkname, hostname) -> host XMLNode (None for hosts of ranges)
+		self._hosts = { }
+		# IP as int -> (networkname, hostname)
+		self._ips = { }
+		# MAC cmpkey -> (networkname, hostname)
+		self._macs = { }
+		for node in self._hostsnode.getchildren("host"):
+			ip = IPv4Addr(node["ip"])
+			key = (self._index.networkof(ip).getname(), node["name"])
+			self._hosts[key] = node
+			self._ips[ip.get()] = key
+			self._macs[MacAddress(node["mac"]).cmpkey()] = key
+		# Hosts of ranges are taken into account, but cannot be edited
+		for hostrange in model.gethostranges():
+			for host in hostrange:
+				key = (hostrange.getnetwork().getname(), host.getname())
+				self._hosts[key] = None
+				self._ips[host.getip().get()] = key
+				self._macs[host.getmac().cmpkey()] = key
+		self._allocators = { }
+		# Added host XMLNode -> sequence number, which keeps them in order
+		self._added = { }
+		self._addedcount = 0
+		self._removed = set()
+		self._undo = None
+
+	@classmethod
+	def fromfile(cls, filename):
+		return cls(XMLParser().parsefile(filename))
+
+	@contextlib.contextmanager
+	def transaction(self):
+		"""Context manager within which all changes are undone if an exception
+		leaves it. Transactions cannot be nested."""
+		assert(self._undo is None)
+		self._undo = [ ]
+		try:
+			yield self
+		except:
+			for undo in reversed(self._undo):
+				undo()
+			raise
+		finally:
+			self._undo = None
+
+	def _onundo(self, undo):
+		if self._undo is not None:
+			self._undo.append(undo)
+
+	def _getnetwork(self, name):
+		network = self._index.getnetwork(name)
+		if network is None:
+			raise Exception("No such network: %s" % (name))
+		return network
+
+	def _getallocator(self, network):
+		allocator = self._allocators.get(network.getname())
+		if allocator is None:
+			allocator = IPAllocator(network, self._ips)
+			self._allocators[network.getname()] = allocator
+		return allocator
+
+	def _lookup(self, fqdn):
+		(name, _, networkname) = fqdn.partition(".")
+		key = (networkname, name)
+		if key not in self._hosts:
+			raise Exception("No such host: %s" % (fqdn))
+		if self._hosts[key] is None:
+			raise Exception("Host %s is part of a host range and cannot be edited individually" % (fqdn))
+		return key
+
+	def _resolveip(self, network, ip):
+		"""Returns the IPv4Addr and network for a host: the given IP (which must
+		be free) or, if ip is None, a newly allocated one from the network."""
+		if ip is None:
+			return (self._getallocator(network).allocate(), network)
+		ip = IPv4Addr(ip) if isinstance(ip, str) else ip
+		ipnetwork = self._index.networkof(ip)
+		if ipnetwork is None:
+			raise Exception("IP address %s is not contained within any declared network" % (ip))
+		if (network is not None) and (ipnetwork is not network):
+			raise Exception("IP address %s is not within network %s" % (ip, network.getname()))
+		if ip.get() in self._ips:
+			raise Exception("Duplicate IP address: %s is already used by %s.%s" % (ip, self._ips[ip.get()][1], self._ips[ip.get()][0]))
+		return (ip, ipnetwork)
+
+	def _insert(self, key, node, ip, mac):
+		self._hosts[key] = node
+		self._ips[ip.get()] = key
+		self._macs[mac.cmpkey()] = key
+
+	def _delete(self, key, ip, mac):
+		del self._hosts[key]
+		del self._ips[ip.get()]
+		del self._macs[mac.cmpkey()]
+		allocator = self._allocators.get(key[0])
+		if allocator is not None:
+			allocator.release(ip.get())
+
+	def addhost(self, name, mac, network = None, ip = None, tags = None, group = None):
+		"""Adds a host. Either the network (name) or the IP address must be
+		given; without IP, the lowest free address of the network is
+		allocated. Returns the IPv4Addr of the new host. If the host is
+		rejected, an allocated address is released again."""
+		if (network is None) and (ip is None):
+			raise Exception("Host %s needs either a network or an IP address" % (name))
+		network = self._getnetwork(network) if (network is not None) else None
+		mac = MacAddress(mac) if isinstance(mac, str) else mac
+		if mac.cmpkey() in self._macs:
+			raise Exception("Duplicate MAC address: %s is already used by %s.%s" % (mac, self._macs[mac.cmpkey()][1], self._macs[mac.cmpkey()][0]))
+		if (network is not None) and ((network.getname(), name) in self._hosts):
+			raise Exception("Duplicate hostname: %s.%s" % (name, network.getname()))
+		allocated = ip is None
+		(ip, network) = self._resolveip(network, ip)
+		key = (network.getname(), name)
+		try:
+			if key in self._hosts:
+				raise Exception("Duplicate hostname: %s.%s" % (name, network.getname()))
+
+			attrs = { "name": name, "ip": str(ip), "mac": str(mac) }
+			if tags:
+				attrs["tags"] = ",".join(tags)
+			if group is not None:
+				attrs["group"] = group
+			node = XMLNode("host", attrs, self._hostsnode)
+			Host(self._xml, node)
+		except:
+			if allocated:
+				self._getallocator(network).release(ip.get())
+			raise
+
+		self._insert(key, node, ip, mac)
+		self._added[node] = self._addedcount
+		self._addedcount += 1
+		def undo():
+			self._delete(key, ip, mac)
+			del self._added[node]
+		self._onundo(undo)
+		return ip
+
+	def removehost(self, fqdn):
+		"""Removes the host with the given fully qualified name. A host that
+		was added in this editor is simply not written anymore."""
+		key = self._lookup(fqdn)
+		node = self._hosts[key]
+		(ip, mac) = (IPv4Addr(node["ip"]), MacAddress(node["mac"]))
+		self._delete(key, ip, mac)
+		addedat = self._added.pop(node, None)
+		if addedat is None:
+			self._removed.add(node)
+		def undo():
+			self._insert(key, node, ip, mac)
+			if addedat is not None:
+				self._added[node] = addedat
+			else:
+				self._removed.discard(node)
+		self._onundo(undo)
+
+	def movehost(self, fqdn, network, ip = None):
+		"""Moves the host with the given fully qualified name into another
+		network (name), either to the given IP address or to a newly
+		allocated one. Returns the new IPv4Addr of the host."""
+		key = self._lookup(fqdn)
+		node = self._hosts[key]
+		network = self._getnetwork(network)
+		newkey = (network.getname(), key[1])
+		if (newkey != key) and (newkey in self._hosts):
+			raise Exception("Duplicate hostname: %s.%s" % (key[1], network.getname()))
+		(oldip, mac) = (IPv4Addr(node["ip"]), MacAddress(node["mac"]))
+		(ip, network) = self._resolveip(network, ip)
+
+		self._delete(key, oldip, mac)
+		self._insert(newkey, node, ip, mac)
+		node["ip"] = str(ip)
+		def undo():
+			self._delete(newkey, ip, mac)
+			self._insert(key, node, oldip, mac)
+			node["ip"] = str(oldip)
+		self._onundo(undo)
+		return ip
+
+	def gethost(self, fqdn):
+		"""Returns the <host> XMLNode of the given fully qualified name or
+		None."""
+		(name, _, networkname) = fqdn.partition(".")
+		return self._hosts.get((networkname, name))
+
+	def _applytree(self):
+		"""Brings added and removed hosts into the XML tree, in one pass over
+		the children of <hosts>. Removed hosts take the whitespace before them
+		with them, added ones are indented like the last existing host."""
+		if (len(self._added) == 0) and (len(self._removed) == 0):
+			return
+		children = list(self._hostsnode.getallchildren())
+		trailer = [ ]
+		if (len(children) > 0) and (children[-1].getname() == XMLNode.CDATA_NODENAME):
+			trailer = [ children.pop() ]
+		indent = "\n\t\t"
+		kept = [ ]
+		for child in children:
+			if child in self._removed:
+				if (len(kept) > 0) and (kept[-1].getname() == XMLNode.CDATA_NODENAME):
+					kept.pop()
+				continue
+			if (child.getname() == XMLNode.CDATA_NODENAME) and (child[XMLNode.CDATA_ATTRIBUTE].strip() == ""):
+				indent = "\n" + child[XMLNode.CDATA_ATTRIBUTE].rsplit("\n", 1)[-1]
+			kept.append(child)
+		for node in sorted(self._added, key = self._added.get):
+			kept.append(XMLNode(XMLNode.CDATA_NODENAME, { XMLNode.CDATA_ATTRIBUTE: indent }, self._hostsnode))
+			kept.append(node)
+		self._hostsnode.replacechildren(kept + trailer)
+		self._added = { }
+		self._removed = set()
+
+	def getxml(self):
+		"""Returns the edited XML tree."""
+		assert(self._undo is None)
+		self._applytree()
+		return self._xml
+
+	def getmodel(self):
+		"""Returns a fully validated ConfigModel of the edited configuration."""
+		return ConfigModel(self.getxml())
+
+	def write(self, f):
+		self.getxml().write(f)
+		f.write("\n")
+
+	def writefile(self, filename):
+		"""Writes the configuration through a large buffer into a temporary
+		file that then replaces the given file."""
+		tmpfilename = filename + ".tmp"
+		try:
+			with open(tmpfilename, "w", buffering = self._WRITEBUFSIZE) as f:
+				self.write(f)
+		except:
+			if os.path.exists(tmpfilename):
+				os.unlink(tmpfilename)
+			raise
+		os.replace(tmpfilename, filename)
@@ -0,0 +1,104 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+from GeneratorRegistry import GeneratorRegistry
+from Profiler import Profiler
+
+class ConfigGenerator():
+	"""In-process entry point for running generators on a ConfigModel. An
+	instance keeps the imported generators and compiled templates between
+	calls, so a long-running process can regenerate configurations without
+	paying startup costs again. Nothing in here exits the process; errors are
+	raised as exceptions (TemplateException for templating errors).
+
+		model = ConfigModel.frombytes(xmldata)
+		files = ConfigGenerator("generators/").render(model, generators = [ "dhcp" ])
+	"""
+
+	def __init__(self, gendir = "generators/", log = None, jobs = 1):
+		self._gendir = gendir
+		self._registry = GeneratorRegistry(gendir)
+		self._log = log
+		self._jobs = jobs
+
+	def getregistry(self):
+		return self._registry
+
+	def preload(self, generators = None):
+		"""Imports the given generators (names, default all of them) and
+		compiles all of their templates up front, e.g. before forking worker
+		processes that shall share them."""
+		from Controller import Controller
+
+		for generatorname in self._registry.select(generators):
+			self._registry.getgenerator(generatorname)
+			Controller.loadtemplates(self._gendir, generatorname)
+
+	def generate(self, model, output, generators = None, networks = None, profiler = None, templateprofiler = None):
+		"""Runs the given generators (names, default all of them) on the model
+		and writes their outputs to the output backend. If networks (Network
+		objects or names) is given, per-network outputs are only created for
+		these networks. If a TemplateProfiler is given, template rendering is
+		traced by it. At the end, the output backend is synced (i.e. all
+		outputs of the run are in place), but not closed."""
+		from Controller import Controller
+
+		if profiler is None:
+			profiler = Profiler(enabled = False)
+		if networks is None:
+			selectednetworks = model.getnetworks()
+		else:
+			selectednetworks = set(model.getnetwork(network) if isinstance(network, str) else network for network in networks)
+
+		# Prepare generator controller data
+		data = {
+			"hosts":			model.gethosts(),
+			"networks":			model.getnetworks(),
+			"selectednetworks":	selectednetworks,
+			"hostsbytag":		model.gethostsbytag(),
+			"hostsbygroup":		model.gethostsbygroup(),
+		}
+
+		# Load and run generators; only the selected ones are ever imported
+		for generatorname in self._registry.select(generators):
+			with profiler.phase("import/" + generatorname):
+				genclass = self._registry.getgenerator(generatorname)
+
+			# Prepare specific controller
+			ctrl = Controller(generatorname, data, self._gendir, output, profiler, self._log, self._jobs, templateprofiler)
+
+			# Instanciate generator and execute
+			with profiler.phase("generate/" + generatorname):
+				generator = genclass(ctrl)
+				generator.generate()
+			profiler.count("generators")
+
+		with profiler.phase("sync"):
+			output.sync()
+
+	def render(self, model, generators = None, networks = None, profiler = None, templateprofiler = None):
+		"""Like generate(), but returns all outputs as a dictionary that maps
+		destination filenames to their content."""
+		from Output import MemoryOutput
+
+		output = MemoryOutput()
+		self.generate(model, output, generators, networks, profiler, templateprofiler)
+		return output.getfiles()
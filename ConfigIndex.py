@@ -0,0 +1,132 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import bisect
+from IPv4 import IPv4Addr
+from Ethernet import MacAddress
+
+class ConfigIndex():
+	"""Lookup indexes over a validated ConfigModel. Hosts are found by name,
+	FQDN, IP or MAC address in constant time; per network, the sorted list of
+	used addresses allows finding free addresses without scanning the whole
+	subnet and the sorted list of network start addresses allows finding the
+	network of any address by bisection."""
+
+	def __init__(self, model):
+		self._model = model
+		self._byname = { }
+		self._byfqdn = { }
+		self._byip = { }
+		self._bymac = { }
+		for host in model.gethosts():
+			self._byname.setdefault(host.getname(), [ ]).append(host)
+			self._byfqdn[self.fqdn(host)] = host
+			self._byip[host.getip().get()] = host
+			self._bymac[host.getmac().cmpkey()] = host
+		for hosts in self._byname.values():
+			hosts.sort()
+
+		self._networksbyname = { network.getname(): network for network in model.getnetworks() }
+		self._usedips = { network.getname(): sorted(host.getip().get() for host in network) for network in model.getnetworks() }
+		self._netstarts = sorted((network.getnet().getnet().get(), network) for network in model.getnetworks())
+		self._netstartvalues = [ start for (start, network) in self._netstarts ]
+
+	@staticmethod
+	def fqdn(host):
+		return "%s.%s" % (host.getname(), host.getnetwork().getname())
+
+	def getmodel(self):
+		return self._model
+
+	def byname(self, name):
+		"""Returns a (sorted) list of all hosts with the given hostname in any
+		network."""
+		return self._byname.get(name, [ ])
+
+	def byfqdn(self, fqdn):
+		return self._byfqdn.get(fqdn)
+
+	def byip(self, ip):
+		"""Returns the host with the given IP (IPv4Addr or string) or None."""
+		if isinstance(ip, str):
+			ip = IPv4Addr(ip)
+		return self._byip.get(ip.get())
+
+	def bymac(self, mac):
+		"""Returns the host with the given MAC (MacAddress or string) or
+		None."""
+		if isinstance(mac, str):
+			mac = MacAddress(mac)
+		return self._bymac.get(mac.cmpkey())
+
+	def getnetwork(self, name):
+		return self._networksbyname.get(name)
+
+	def networkof(self, ip):
+		"""Returns the network containing the given IP (IPv4Addr or string)
+		or None."""
+		if isinstance(ip, str):
+			ip = IPv4Addr(ip)
+		index = bisect.bisect_right(self._netstartvalues, ip.get()) - 1
+		while index >= 0:
+			network = self._netstarts[index][1]
+			if network.getnet().contains(ip):
+				return network
+			index -= 1
+		return None
+
+	def freeranges(self, network):
+		"""Returns the addresses of the network that are neither used by a
+		host, a router or server of the network (see
+		Network.getreservedips()) nor part of the dynamic DHCP range as a list
+		of (first, last) IPv4Addr tuples. Network and broadcast address are
+		excluded."""
+		if isinstance(network, str):
+			network = self._networksbyname[network]
+		net = network.getnet()
+		first = net.getnet().get() + 1
+		last = net.getnet().get() + ((~net.getmask().get()) & 0xffffffff) - 1
+
+		reserved = [ (ip, ip) for ip in self._usedips[network.getname()] ]
+		reserved += [ (ip, ip) for ip in network.getreservedips() ]
+		if network.hasdhcp():
+			reserved.append((network.getdhcp().getrangefrom().get(), network.getdhcp().getrangeto().get()))
+		reserved.sort()
+
+		ranges = [ ]
+		current = first
+		for (lo, hi) in reserved:
+			if lo > current:
+				ranges.append((current, min(lo - 1, last)))
+			current = max(current, hi + 1)
+			if current > last:
+				break
+		if current <= last:
+			ranges.append((current, last))
+		return [ (IPv4Addr().setdecimal(lo), IPv4Addr().setdecimal(hi)) for (lo, hi) in ranges if lo <= hi ]
+
+	def nextfree(self, network):
+		"""Returns the lowest free address of the network (see freeranges) or
+		None if the network is full."""
+		ranges = self.freeranges(network)
+		if len(ranges) == 0:
+			return None
+		return ranges[0][0]
@@ -0,0 +1,200 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import xml.parsers.expat
+from Representation import Host, HostRange, Network, DNSInfo, DHCPInfo, DNSServerInfo
+
+class ConfigLoader():
+	"""Loads the hosts and networks of a configuration file in a single pass
+	of expat callbacks, without building an XMLNode tree first. The elements
+	a host or network consists of are collected as plain values while they
+	stream by and turned into Host, Network, DHCPInfo and DNSInfo objects as
+	soon as the closing tag is seen. Elements are recognized by their path
+	below the root element; elements at any other place are rejected, as is a
+	configuration without <hosts> or <networks>. Errors are reported with the
+	line of the offending element."""
+
+	def __init__(self):
+		self._parser = xml.parsers.expat.ParserCreate()
+		self._parser.StartElementHandler = self._startelement
+		self._parser.EndElementHandler = self._endelement
+		self._path = [ ]
+		self._hosts = [ ]
+		self._networks = [ ]
+		self._host = None
+		self._network = None
+		self._sections = set()
+		# Path of element names below the root element -> handler(attrs)
+		self._starthandlers = {
+			("hosts", ):										self._section,
+			("hosts", "host"):									self._starthost,
+			("hosts", "hostrange"):								self._hostrange,
+			("hosts", "host", "dns"):							self._starthostdns,
+			("hosts", "host", "dns", "hinfo"):					self._hinfo,
+			("hosts", "host", "dns", "text"):					self._text,
+			("hosts", "host", "dns", "cname"):					self._cname,
+			("networks", ):										self._section,
+			("networks", "network"):							self._startnetwork,
+			("networks", "network", "dhcp"):					self._startdhcp,
+			("networks", "network", "dns"):						self._startnetworkdns,
+			("networks", "network", "dns", "authority"):		self._authority,
+			("networks", "network", "dhcp", "range"):			self._dhcpfirst,
+			("networks", "network", "dhcp", "broadcast"):		self._dhcpfirst,
+			("networks", "network", "dhcp", "router"):			self._dhcpfirst,
+			("networks", "network", "dhcp", "leasetime"):		self._dhcpfirst,
+			("networks", "network", "dhcp", "pxe"):				self._dhcpfirst,
+			("networks", "network", "dhcp", "dnsserver"):		self._dhcplist,
+			("networks", "network", "dhcp", "ntpserver"):		self._dhcplist,
+		}
+
+	@staticmethod
+	def _attr(attrs, element, name):
+		value = attrs.get(name)
+		if value is None:
+			raise Exception("<%s> lacks the attribute '%s'" % (element, name))
+		return value
+
+	def _startelement(self, name, attrs):
+		self._path.append(name)
+		if len(self._path) == 1:
+			# Root element, its name does not matter
+			return
+		handler = self._starthandlers.get(tuple(self._path[1:]))
+		try:
+			if handler is None:
+				raise Exception("Unexpected element <%s> within <%s>" % (name, self._path[-2]))
+			handler(attrs)
+		except Exception as e:
+			raise Exception("line %d: %s" % (self._parser.CurrentLineNumber, str(e)))
+
+	def _endelement(self, name):
+		self._path.pop()
+		if (name == "host") and (self._host is not None):
+			host = self._host
+			self._host = None
+			try:
+				dns = DNSInfo.fromvalues(host["hinfo"], host["text"], host["cname"]) if host["dns"] else None
+				attrs = host["attrs"]
+				self._hosts.append(Host.fromvalues(self._attr(attrs, "host", "name"), self._attr(attrs, "host", "ip"), self._attr(attrs, "host", "mac"), attrs.get("tags", ""), attrs.get("group"), dns, host["line"]))
+			except Exception as e:
+				raise Exception("line %d: %s" % (host["line"], str(e)))
+		elif (name == "network") and (self._network is not None):
+			network = self._network
+			self._network = None
+			try:
+				self._networks.append(self._makenetwork(network))
+			except Exception as e:
+				raise Exception("line %d: %s" % (network["line"], str(e)))
+
+	def _makenetwork(self, network):
+		dhcp = network["dhcp"]
+		if dhcp is not None:
+			if "range" not in dhcp:
+				raise Exception("<dhcp> has no <range>")
+			dhcp = DHCPInfo.fromvalues(
+				(self._attr(dhcp["range"], "range", "from"), self._attr(dhcp["range"], "range", "to")),
+				self._attr(dhcp["broadcast"], "broadcast", "ip") if ("broadcast" in dhcp) else None,
+				[ self._attr(attrs, "dnsserver", "ip") for attrs in dhcp["dnsserver"] ],
+				self._attr(dhcp["router"], "router", "ip") if ("router" in dhcp) else None,
+				[ self._attr(attrs, "ntpserver", "ip") for attrs in dhcp["ntpserver"] ],
+				(self._attr(dhcp["leasetime"], "leasetime", "default"), self._attr(dhcp["leasetime"], "leasetime", "max")) if ("leasetime" in dhcp) else None,
+				(self._attr(dhcp["pxe"], "pxe", "filename"), self._attr(dhcp["pxe"], "pxe", "next")) if ("pxe" in dhcp) else None,
+			)
+		dns = network["dns"]
+		if dns is not None:
+			if dns["authority"] is None:
+				raise Exception("<dns> has no <authority>")
+			dns = DNSServerInfo.fromvalues(self._attr(dns["authority"], "authority", "ip"))
+		attrs = network["attrs"]
+		return Network.fromvalues(self._attr(attrs, "network", "subnet"), self._attr(attrs, "network", "name"), dhcp, dns, network["line"])
+
+	def _section(self, attrs):
+		if self._path[-1] in self._sections:
+			raise Exception("Duplicate <%s> element" % (self._path[-1]))
+		self._sections.add(self._path[-1])
+
+	def _starthost(self, attrs):
+		self._host = { "attrs": attrs, "line": self._parser.CurrentLineNumber, "dns": False, "hinfo": None, "text": [ ], "cname": [ ] }
+
+	def _hostrange(self, attrs):
+		attr = lambda name: self._attr(attrs, "hostrange", name)
+		self._hosts.append(HostRange.fromvalues(attr("prefix"), attrs.get("digits", "0"), attrs.get("first", "1"), attr("count"), attr("ip"), attr("mac"), attrs.get("tags", ""), attrs.get("group"), self._parser.CurrentLineNumber))
+
+	def _starthostdns(self, attrs):
+		if self._host is not None:
+			self._host["dns"] = True
+
+	def _hinfo(self, attrs):
+		# Like the XMLNode based constructors, only the first HINFO counts
+		if (self._host is not None) and (self._host["hinfo"] is None):
+			self._host["hinfo"] = (self._attr(attrs, "hinfo", "arch"), self._attr(attrs, "hinfo", "os"))
+
+	def _text(self, attrs):
+		if self._host is not None:
+			self._host["text"].append(self._attr(attrs, "text", "value"))
+
+	def _cname(self, attrs):
+		if self._host is not None:
+			self._host["cname"].append(self._attr(attrs, "cname", "name"))
+
+	def _startnetwork(self, attrs):
+		self._network = { "attrs": attrs, "line": self._parser.CurrentLineNumber, "dhcp": None, "dns": None }
+
+	def _startdhcp(self, attrs):
+		if self._network is not None:
+			self._network["dhcp"] = { "dnsserver": [ ], "ntpserver": [ ] }
+
+	def _startnetworkdns(self, attrs):
+		if self._network is not None:
+			self._network["dns"] = { "authority": None }
+
+	def _authority(self, attrs):
+		if (self._network is not None) and (self._network["dns"] is not None) and (self._network["dns"]["authority"] is None):
+			self._network["dns"]["authority"] = attrs
+
+	def _dhcpfirst(self, attrs):
+		if (self._network is not None) and (self._network["dhcp"] is not None):
+			self._network["dhcp"].setdefault(self._path[-1], attrs)
+
+	def _dhcplist(self, attrs):
+		if (self._network is not None) and (self._network["dhcp"] is not None):
+			self._network["dhcp"][self._path[-1]].append(attrs)
+
+	def loadhandle(self, f):
+		"""Loads from the given binary file object and returns a tuple (hosts,
+		networks) of lists; hosts also contains the HostRange objects."""
+		self._parser.ParseFile(f)
+		return self._result()
+
+	def loadfile(self, filename):
+		with open(filename, "rb") as f:
+			return self.loadhandle(f)
+
+	def load(self, xmldata):
+		"""Loads from the given XML text (str or bytes)."""
+		self._parser.Parse(xmldata, True)
+		return self._result()
+
+	def _result(self):
+		for section in [ "hosts", "networks" ]:
+			if section not in self._sections:
+				raise Exception("Configuration has no <%s> element" % (section))
+		return (self._hosts, self._networks)
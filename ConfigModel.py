@@ -0,0 +1,274 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import bisect
+import itertools
+from ConfigLoader import ConfigLoader
+from Representation import Host, HostRange, HostSet, Network
+from IPv4 import IPv4Addr
+from Profiler import Profiler
+
+class ConfigModel():
+	"""The validated model of a networkconfig XML file, i.e. all hosts and
+	networks with every host assigned to the network that contains it.
+	Construction raises an exception if the configuration is inconsistent.
+	Host ranges are validated as intervals and never expanded."""
+
+	def __init__(self, xml, profiler = None):
+		if profiler is None:
+			profiler = Profiler(enabled = False)
+
+		# "model" covers construction including validation
+		with profiler.phase("model"):
+			with profiler.phase("model/hosts"):
+				hosts = [ Host(xml, host) for host in xml.hosts.getchildren("host") ]
+				hosts += [ HostRange(xml, hostrange) for hostrange in xml.hosts.getchildren("hostrange") ]
+			with profiler.phase("model/networks"):
+				networks = [ Network(xml, network) for network in xml.networks.network ]
+			self._build(hosts, networks, profiler)
+
+	@classmethod
+	def fromobjects(cls, hosts, networks, profiler = None):
+		"""Creates the model from already constructed Host (or HostRange) and
+		Network objects (e.g. by ConfigLoader) instead of an XMLNode tree."""
+		if profiler is None:
+			profiler = Profiler(enabled = False)
+		model = cls.__new__(cls)
+		with profiler.phase("model"):
+			model._build(hosts, networks, profiler)
+		return model
+
+	@classmethod
+	def fromfile(cls, filename, profiler = None):
+		if profiler is None:
+			profiler = Profiler(enabled = False)
+		with profiler.phase("parse"):
+			(hosts, networks) = ConfigLoader().loadfile(filename)
+		return cls.fromobjects(hosts, networks, profiler)
+
+	@classmethod
+	def frombytes(cls, xmldata, profiler = None):
+		if profiler is None:
+			profiler = Profiler(enabled = False)
+		with profiler.phase("parse"):
+			(hosts, networks) = ConfigLoader().load(xmldata)
+		return cls.fromobjects(hosts, networks, profiler)
+
+	@staticmethod
+	def _where(obj):
+		linenumber = obj.getlinenumber()
+		return "" if (linenumber is None) else " (line %d)" % (linenumber)
+
+	def _build(self, hosts, networks, profiler):
+		self._profiler = profiler
+		self._hostsbytag = None
+		self._hostsbygroup = None
+
+		with profiler.phase("model/hosts"):
+			self._hosts = set()
+			self._hostranges = [ ]
+			for host in hosts:
+				if isinstance(host, HostRange):
+					self._hostranges.append(host)
+					continue
+				if host in self._hosts:
+					raise Exception("Duplicate host: %s is declared more than once%s" % (str(host), self._where(host)))
+				self._hosts.add(host)
+
+		with profiler.phase("model/networks"):
+			self._networks = set(networks)
+		profiler.count("hosts", len(self._hosts) + sum(len(hostrange) for hostrange in self._hostranges))
+		profiler.count("networks", len(self._networks))
+
+		self._validate()
+
+	@staticmethod
+	def _overlapping(intervals):
+		"""Sorts a list of (first, last, obj) intervals in place and returns
+		the first pair of objects whose intervals overlap or None."""
+		intervals.sort(key = lambda interval: interval[0])
+		for (previous, current) in zip(intervals, intervals[1:]):
+			if current[0] <= previous[1]:
+				return (previous[2], current[2])
+		return None
+
+	@staticmethod
+	def _intervalof(intervals, starts, value):
+		"""Returns the object of the interval (of the sorted, non-overlapping
+		intervals with the given start values) that contains value or None."""
+		index = bisect.bisect_right(starts, value) - 1
+		if (index >= 0) and (intervals[index][1] >= value):
+			return intervals[index][2]
+		return None
+
+	def _validate(self):
+		hosts = self._hosts
+		hostranges = self._hostranges
+		networks = self._networks
+		profiler = self._profiler
+
+		# Resolve that every host is in exactly one network
+		with profiler.phase("validate/containment"):
+			for host in hosts:
+				contained = False
+				for network in networks:
+					if network.contains(host):
+						contained = True
+						host.setnetwork(network)
+						network.addhost(host)
+				if not contained:
+					raise Exception("Host %s with IP %s is not contained within any declared network.%s" % (host.getname(), host.getip(), self._where(host)))
+
+			# A range is contained if its first and last address are
+			for hostrange in hostranges:
+				(first, last) = (IPv4Addr().setdecimal(ip) for ip in hostrange.getiprange())
+				for network in networks:
+					if network.getnet().contains(first) and network.getnet().contains(last):
+						hostrange.setnetwork(network)
+						network.addhostrange(hostrange)
+				if hostrange.getnetwork() is None:
+					raise Exception("Host range %s is not contained within any declared network.%s" % (str(hostrange), self._where(hostrange)))
+
+		# Ensure that network suffixes are unique
+		with profiler.phase("validate/netnames"):
+			netnames = set()
+			for network in networks:
+				if network.getname() in netnames:
+					raise Exception("Duplicate network name: %s%s" % (network.getname(), self._where(network)))
+				netnames.add(network.getname())
+
+		# Ensure that names are unique within networks
+		with profiler.phase("validate/hostnames"):
+			for network in networks:
+				names = set()
+				for host in network.getexplicithosts():
+					if host.getname() in names:
+						raise Exception("Duplicate hostname: %s.%s%s" % (host.getname(), network.getname(), self._where(host)))
+					names.add(host.getname())
+
+				rangesbyprefix = { }
+				for hostrange in network.gethostranges():
+					for other in rangesbyprefix.get(hostrange.getprefix(), [ ]):
+						if hostrange.namescollide(other):
+							raise Exception("Duplicate hostname: host ranges %s and %s in %s have names in common%s" % (str(other), str(hostrange), network.getname(), self._where(hostrange)))
+					rangesbyprefix.setdefault(hostrange.getprefix(), [ ]).append(hostrange)
+				if len(rangesbyprefix) > 0:
+					for name in names:
+						for hostrange in rangesbyprefix.get(HostRange.splitname(name)[0], [ ]):
+							if hostrange.containsname(name):
+								raise Exception("Duplicate hostname: %s.%s is also part of host range %s%s" % (name, network.getname(), str(hostrange), self._where(hostrange)))
+
+		# Ensure that MAC and IP addresses are unique within the whole config domain
+		with profiler.phase("validate/addresses"):
+			macs = { }
+			ips = { }
+			for host in hosts:
+				if host.getmac() in macs:
+					raise Exception("Duplicate MAC address: %s by %s collides with %s%s" % (host.getmac(), str(host), str(macs[host.getmac()]), self._where(host)))
+				if host.getip() in ips:
+					raise Exception("Duplicate IP address: %s by %s collides with %s (next available is %s)%s" % (host.getip(), str(host), str(ips[host.getip()]), host.getnetwork().getnextavailableip(), self._where(host)))
+				ips[host.getip()] = host
+				macs[host.getmac()] = host
+
+			# Ranges are checked as intervals, against each other and then
+			# every host against the (now non-overlapping) ranges
+			if len(hostranges) > 0:
+				for (getrange, kind) in [ (lambda hostrange: hostrange.getiprange(), "IP"), (lambda hostrange: hostrange.getmacrange(), "MAC") ]:
+					intervals = [ getrange(hostrange) + (hostrange, ) for hostrange in hostranges ]
+					collision = self._overlapping(intervals)
+					if collision is not None:
+						raise Exception("Duplicate %s address: host ranges %s and %s overlap%s" % (kind, str(collision[0]), str(collision[1]), self._where(collision[1])))
+					starts = [ interval[0] for interval in intervals ]
+					for host in hosts:
+						value = host.getip().get() if (kind == "IP") else host.getmac().toint()
+						hostrange = self._intervalof(intervals, starts, value)
+						if hostrange is not None:
+							raise Exception("Duplicate %s address: %s collides with host range %s%s" % (kind, str(host), str(hostrange), self._where(host)))
+
+	def gethosts(self):
+		"""Returns all hosts, including the ones of host ranges, as an iterable
+		HostSet."""
+		return HostSet(self._hosts, self._hostranges)
+
+	def gethostranges(self):
+		return self._hostranges
+
+	def getnetworks(self):
+		return self._networks
+
+	def _buildtagindex(self):
+		hostsbytag = { }
+		hostsbygroup = { }
+		# Hosts of ranges are only created for ranges that have tags at all
+		tagged = itertools.chain(self._hosts, *(hostrange for hostrange in self._hostranges if hostrange.hastagsorgroup()))
+		for host in tagged:
+			for tag in host.gettags():
+				hostsbytag.setdefault(tag, [ ]).append(host)
+			if host.getgroup() is not None:
+				hostsbygroup.setdefault(host.getgroup(), [ ]).append(host)
+
+		# Only tagged hosts are sorted, using the plain values of their cmpkey
+		sortkey = lambda host: (host.getip().get(), host.getname())
+		for hosts in list(hostsbytag.values()) + list(hostsbygroup.values()):
+			hosts.sort(key = sortkey)
+		(self._hostsbytag, self._hostsbygroup) = (hostsbytag, hostsbygroup)
+
+	def gethostsbytag(self):
+		"""Returns a dictionary that maps every tag to the sorted list of
+		hosts carrying it. The index is built once, on first use."""
+		if self._hostsbytag is None:
+			self._buildtagindex()
+		return self._hostsbytag
+
+	def gethostsbygroup(self):
+		"""Returns a dictionary that maps every group name to the sorted list
+		of its hosts. The index is built once, on first use."""
+		if self._hostsbygroup is None:
+			self._buildtagindex()
+		return self._hostsbygroup
+
+	def getnetwork(self, name):
+		"""Returns the network with the given name or raises an exception if
+		no such network exists."""
+		for network in self._networks:
+			if network.getname() == name:
+				return network
+		raise Exception("No such network: %s" % (name))
+
+	def getnetworkfingerprints(self):
+		"""Returns a dictionary that maps every network name to a value which
+		changes whenever the network itself or any of its hosts changes."""
+		sortkey = lambda host: (host.getip().get(), host.getname())
+		return { network.getname(): (
+			network.getfingerprint(),
+			tuple(host.getfingerprint() for host in sorted(network.getexplicithosts(), key = sortkey)),
+			tuple(sorted(hostrange.getfingerprint() for hostrange in network.gethostranges())),
+		) for network in self._networks }
+
+	def changednetworks(self, other):
+		"""Compares this (old) model against another (new) one and returns a
+		tuple (changed, removed): the set of networks of the new model that
+		were added or differ in any way and the set of names of networks that
+		no longer exist."""
+		(oldprints, newprints) = (self.getnetworkfingerprints(), other.getnetworkfingerprints())
+		changed = set(network for network in other.getnetworks() if oldprints.get(network.getname()) != newprints[network.getname()])
+		removed = set(name for name in oldprints if name not in newprints)
+		return (changed, removed)
@@ -19,48 +19,193 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
-import sys
 import os
 import time
+import shutil
+import tempfile
+import multiprocessing
 
-import mako.template, mako.exceptions
+import mako.template, mako.exceptions, mako.runtime
 from mako.lookup import TemplateLookup
+from FastEmitter import FastEmitter
+from Profiler import Profiler
+from TemplateProfiler import TemplateProfiler
+
+class TemplateException(Exception):
+	"""Raised when rendering a template fails. The message contains the
+	Mako-decoded stack trace, which points to the offending template line."""
+	def __init__(self, filename, stacktrace):
+		Exception.__init__(self, "Templating error in %s. Mako-decoded stacktrace follows:\n%s" % (filename, stacktrace))
+		self.filename = filename
+		self.stacktrace = stacktrace
+
+	def __reduce__(self):
+		# Allows passing the exception back from worker processes
+		return (TemplateException, (self.filename, self.stacktrace))
 
 class _Template():
-	def __init__(self, filename):
-		self._template = mako.lookup.Template(open(filename, "r").read())
+	_cache = { }
+
+	def __init__(self, filename, mtime = None):
+		self._filename = filename
+		self._mtime = mtime
+		with open(filename, "r") as f:
+			self._source = f.read()
+		self._template = mako.lookup.Template(self._source)
+		self._linemap = None
+
+	def getidentity(self):
+		"""Returns a value that changes whenever the template file changes."""
+		return (self._filename, self._mtime)
+
+	def getfilename(self):
+		return self._filename
+
+	def getsourcelines(self):
+		return self._source.split("\n")
+
+	def getcodefilename(self):
+		"""Returns the filename under which the code of the compiled template
+		runs, i.e. the co_filename of its frames."""
+		return self._template.module.__name__
+
+	def getlinemap(self):
+		"""Returns a list that maps (zero-based) lines of the compiled Python
+		code to (one-based) template source lines; 0 denotes lines that have
+		no template source."""
+		if self._linemap is None:
+			self._linemap = mako.template.ModuleInfo.get_module_source_metadata(self._template.code, full_line_map = True)["full_line_map"]
+		return self._linemap
+
+	@classmethod
+	def load(cls, filename):
+		"""Returns the compiled template for the given file. Compiled templates
+		are kept for as long as the template file does not change."""
+		mtime = os.stat(filename).st_mtime_ns
+		cached = cls._cache.get(filename)
+		if (cached is None) or (cached[0] != mtime):
+			cached = (mtime, cls(filename, mtime))
+			cls._cache[filename] = cached
+		return cached[1]
 
 	def render(self, parameters):
 		assert(isinstance(parameters, dict))
 		try:
 			renderresult = self._template.render(**parameters)
-		except:
-			print("Templating error, cannot continue. Mako-decoded stacktrace follows:", file = sys.stderr)
-			print(mako.exceptions.text_error_template().render())
-			sys.exit(1)
+		except Exception:
+			raise TemplateException(self._filename, mako.exceptions.text_error_template().render())
 
 		return renderresult
 
+	def renderto(self, f, parameters):
+		"""Streams the rendered template directly into the file-like object f
+		instead of building the complete result as a string first."""
+		assert(isinstance(parameters, dict))
+		try:
+			self._template.render_context(mako.runtime.Context(f, **parameters))
+		except Exception:
+			raise TemplateException(self._filename, mako.exceptions.text_error_template().render())
+
+# Render jobs and spool directory of the worker process. They are handed to the
+# pool initializer, which the forked workers inherit without pickling, so
+# neither templates nor the model need to be pickled.
+_forkjobs = None
+
+def _initforkworker(jobs, spooldir):
+	global _forkjobs
+	_forkjobs = (jobs, spooldir)
+
+def _renderforkjob(index):
+	"""Streams the rendered output into a spool file, so that neither the
+	worker nor the parent ever holds a complete output in memory, and
+	returns the spool filename."""
+	(jobs, spooldir) = _forkjobs
+	(template, renderdata) = jobs[index]
+	spoolfilename = os.path.join(spooldir, str(index))
+	with open(spoolfilename, "w", encoding = "utf-8", newline = "") as f:
+		template.renderto(f, renderdata)
+	return spoolfilename
+
 class Controller():
-	def __init__(self, generatorname, data, cmdlineargs):
+	_SPOOLCOPYSIZE = 256 * 1024
+
+	def __init__(self, generatorname, data, gendir, output, profiler = None, log = None, jobs = 1, templateprofiler = None):
 		self._generatorname = generatorname
 		self._data = data
-		self._cmdlineargs = cmdlineargs
+		self._gendir = gendir
+		self._output = output
+		if profiler is None:
+			profiler = Profiler(enabled = False)
+		self._profiler = profiler
+		self._log = log
+		self._jobs = jobs
+		if templateprofiler is None:
+			templateprofiler = TemplateProfiler(enabled = False)
+		self._templateprofiler = templateprofiler
+
+	@staticmethod
+	def loadtemplates(gendir, generatorname):
+		"""Compiles all templates (*.tmpl files) of the generator into the
+		template cache, so that rendering does not need to compile them
+		anymore."""
+		path = os.path.join(gendir, generatorname)
+		for filename in sorted(os.listdir(path)):
+			if filename.endswith(".tmpl"):
+				_Template.load(os.path.join(path, filename))
 
 	def getnetworks(self):
+		"""Returns the networks for which per-network outputs shall be created.
+		These may be a subset of all networks when only some networks were
+		selected for regeneration."""
+		return self._data.get("selectednetworks", self._data["networks"])
+
+	def getallnetworks(self):
+		"""Returns all networks, regardless of any network selection. Outputs
+		that cover the whole configuration need these."""
 		return self._data["networks"]
 
 	def gethosts(self):
 		return self._data["hosts"]
 
+	def gethostsbytag(self, tag):
+		"""Returns the sorted list of hosts carrying the given tag."""
+		return self._data["hostsbytag"].get(tag, [ ])
+
+	def gethostsbygroup(self, group):
+		"""Returns the sorted list of hosts of the given group."""
+		return self._data["hostsbygroup"].get(group, [ ])
+
 	# Keyword arguments
 	# data (dict)
 	# perms (permissions as int, default 0o644)
 	# usergrp (user/group as string, defaults "root:root")
+	# fingerprint (any comparable value, default None). If given and the
+	#	output backend knows that it already holds this output created from
+	#	the same template and fingerprint, the output is not recreated. The
+	#	fingerprint must therefore capture everything the output depends on.
+	#	Outputs without fingerprint are recreated on every run.
 	def instanciate(self, templatename, destfilename, **kwargs):
+		self.instanciatemany([ (templatename, destfilename, kwargs) ])
+
+	def _prepare(self, templatename, destfilename, kwargs):
+		"""Returns a tuple (template, renderdata, perms, usergrp, fingerprint)
+		for the job or None if the output is already up to date."""
 		perms = kwargs.get("perms", 0o644)
 		usergrp = kwargs.get("usergrp", "root:root")
-		print("%s: Creating %s from %s -> %s with %o perms" % (self._generatorname, destfilename, templatename, usergrp, perms), file = sys.stderr)
+
+		phase = "generate/" + self._generatorname
+		with self._profiler.phase(phase + "/compile"):
+			template = _Template.load(os.path.join(self._gendir, self._generatorname, templatename))
+
+		fingerprint = kwargs.get("fingerprint")
+		if fingerprint is not None:
+			fingerprint = (template.getidentity(), fingerprint)
+		if self._output.isuptodate(destfilename, fingerprint):
+			self._profiler.count("outputsuptodate")
+			return None
+
+		if self._log is not None:
+			self._log("%s: Creating %s from %s -> %s with %o perms" % (self._generatorname, destfilename, templatename, usergrp, perms))
 
 		# Some templates have special data
 		renderdata = kwargs.get("data", { })
@@ -71,22 +216,73 @@ class Controller():
 			"DO NOT CHANGE MANUALLY. All changes will be overwritten.",
 		]
 
-		# But these are available in every script
+		# But these are available in every script. Tagged hosts and groups are
+		# sorted lists of hosts, e.g. hostsbytag.get("pxe", [ ]).
 		renderdata.update({
 			"hosts":		self._data["hosts"],
 			"networks":		self._data["networks"],
+			"hostsbytag":	self._data["hostsbytag"],
+			"hostsbygroup":	self._data["hostsbygroup"],
 			"geninfo":		infolines,
+			"FastEmitter":	FastEmitter,
 		})
+		return (template, renderdata, perms, usergrp, fingerprint)
 
-		template = _Template(self._cmdlineargs.gendir + self._generatorname + "/" + templatename)
-		result = template.render(renderdata)
+	def instanciatemany(self, jobs):
+		"""Instanciates a list of (templatename, destfilename, kwargs) jobs;
+		the keyword arguments are the same as for instanciate(). If more than
+		one job needs rendering and the controller may use more than one
+		process, the jobs are rendered in parallel by forked worker processes
+		and committed to the output in order. Workers stream their outputs
+		into spool files from which they are copied into the output, so
+		memory use does not grow with the size of the outputs. Template
+		profiling traces the rendering process, so jobs are then always
+		rendered sequentially."""
+		prepared = [ ]
+		for (templatename, destfilename, kwargs) in jobs:
+			job = self._prepare(templatename, destfilename, kwargs)
+			if job is not None:
+				prepared.append((destfilename, ) + job)
 
-		outfilename = self._cmdlineargs.outdir + destfilename
-		outdir = os.path.dirname(outfilename)
-		try:
-			os.makedirs(outdir)
-		except OSError:
-			pass
+		phase = "generate/" + self._generatorname
+		if (self._jobs > 1) and (not self._templateprofiler.isenabled()) and (len(prepared) > 1) and ("fork" in multiprocessing.get_all_start_methods()):
+			forkjobs = [ (template, renderdata) for (destfilename, template, renderdata, perms, usergrp, fingerprint) in prepared ]
+			# Background threads of the output must not run while forking
+			self._output.suspend()
+			spooldir = tempfile.mkdtemp(prefix = "networkconfig-")
+			try:
+				with multiprocessing.get_context("fork").Pool(min(self._jobs, len(prepared)), _initforkworker, (forkjobs, spooldir)) as pool:
+					with self._profiler.phase(phase + "/render"):
+						results = pool.imap(_renderforkjob, range(len(prepared)))
+						for ((destfilename, template, renderdata, perms, usergrp, fingerprint), spoolfilename) in zip(prepared, results):
+							pending = self._output.open(destfilename, perms, usergrp)
+							try:
+								with open(spoolfilename, encoding = "utf-8", newline = "") as f:
+									shutil.copyfileobj(f, pending, self._SPOOLCOPYSIZE)
+							except:
+								self._output.abort(pending)
+								raise
+							os.unlink(spoolfilename)
+							self._commit(pending, fingerprint)
+			finally:
+				shutil.rmtree(spooldir, ignore_errors = True)
+			return
+
+		for (destfilename, template, renderdata, perms, usergrp, fingerprint) in prepared:
+			# Output is streamed while rendering, so "render" includes the
+			# buffered writes and "write" covers finishing the output (e.g.
+			# the final flush and rename into place).
+			pending = self._output.open(destfilename, perms, usergrp)
+			try:
+				with self._profiler.phase(phase + "/render"), self._templateprofiler.trace(self._generatorname, template):
+					template.renderto(pending, renderdata)
+			except:
+				self._output.abort(pending)
+				raise
+			self._commit(pending, fingerprint)
 
-		with open(outfilename, "w") as f:
-			f.write(result)
+	def _commit(self, pending, fingerprint):
+		with self._profiler.phase("generate/" + self._generatorname + "/write"):
+			size = self._output.commit(pending, fingerprint)
+		self._profiler.count("outputs")
+		self._profiler.count("outputbytes", size)
@@ -32,6 +32,19 @@ class MacAddress(Comparable):
 		self._mac = [ int(x, 16) for x in match.groups() ]
 		self._required([ 0 <= x <= 255 for x in self._mac ])
 
+	@classmethod
+	def fromint(cls, value):
+		"""Creates the MAC address from its 48 bit integer value."""
+		if not (0 <= value <= 0xffffffffffff):
+			raise Exception("%d is not a valid ethernet MAC address value." % (value))
+		mac = cls.__new__(cls)
+		mac._mac = list(value.to_bytes(6, "big"))
+		mac._text = None
+		return mac
+
+	def toint(self):
+		return int.from_bytes(bytes(self._mac), "big")
+
 	def _required(self, condition):
 		if not condition:
 			raise Exception("%s is not a valid ethernet MAC address." % (self._text))
@@ -40,7 +53,7 @@ class MacAddress(Comparable):
 		return tuple(self._mac)
 
 	def __str__(self):
-		return ":".join([ "%02x" % (x) for x in self._mac ])
+		return "%02x:%02x:%02x:%02x:%02x:%02x" % tuple(self._mac)
 
 if __name__ == "__main__":
 	x = MacAddress("00:1A:22:33-44:55")
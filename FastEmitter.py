@@ -0,0 +1,82 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+class FastEmitter():
+	"""Emits high-volume, purely repetitive template sections (one line or
+	block per host) without going through Mako expressions. Output is
+	byte-identical to the equivalent template loops, but lines are formatted
+	from precomputed columns and written in large batches. The target is any
+	object with a write() method, usually the Mako 'context' of the calling
+	template:
+
+		<% FastEmitter(context).ethers(hosts) %>\\
+	"""
+	def __init__(self, f, batchsize = 4096):
+		self._f = f
+		self._batchsize = batchsize
+
+	@staticmethod
+	def _sortkey(host):
+		return (host.getip().get(), host.getname())
+
+	def _batches(self, hosts):
+		"""Sorts the hosts in the same order as sorted(list(hosts)) would and
+		yields them in slices of at most batchsize hosts."""
+		sortedhosts = sorted(hosts, key = self._sortkey)
+		for i in range(0, len(sortedhosts), self._batchsize):
+			yield sortedhosts[i : i + self._batchsize]
+
+	def ethers(self, hosts):
+		"""Writes one '<mac>\\t\\t<name>' line per host, sorted by IP."""
+		for batch in self._batches(hosts):
+			macs = [ str(host.getmac()) for host in batch ]
+			names = [ host.getname() for host in batch ]
+			self._f.write("".join([ "%s\t\t%s\n" % line for line in zip(macs, names) ]))
+
+	def dhcphosts(self, hosts):
+		"""Writes one ISC dhcpd 'host' block per host, sorted by IP."""
+		for batch in self._batches(hosts):
+			fqdns = [ "%s.%s" % (host.getname(), host.getnetwork().getname()) for host in batch ]
+			macs = [ str(host.getmac()) for host in batch ]
+			ips = [ str(host.getip()) for host in batch ]
+			self._f.write("".join([ "host %s {\n\thardware ethernet %s;\n\tfixed-address %s;\n}\n\n" % block for block in zip(fqdns, macs, ips) ]))
+
+if __name__ == "__main__":
+	import io
+	from XMLParser import XMLParser
+	from Representation import Host, Network
+
+	xml = XMLParser().parsefile("example.xml")
+	networks = [ Network(xml, node) for node in xml.networks.network ]
+	hosts = [ Host(xml, node) for node in xml.hosts.host ]
+	for host in hosts:
+		for network in networks:
+			if network.contains(host):
+				host.setnetwork(network)
+
+	f = io.StringIO()
+	FastEmitter(f, batchsize = 2).ethers(hosts)
+	assert(f.getvalue() == "".join("%s\t\t%s\n" % (host.getmac(), host.getname()) for host in sorted(list(hosts))))
+
+	f = io.StringIO()
+	FastEmitter(f, batchsize = 2).dhcphosts(hosts)
+	assert(f.getvalue() == "".join("host %s.%s {\n\thardware ethernet %s;\n\tfixed-address %s;\n}\n\n" % (host.getname(), host.getnetwork().getname(), host.getmac(), host.getip()) for host in sorted(list(hosts))))
+	print(f.getvalue(), end = "")
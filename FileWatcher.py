@@ -0,0 +1,58 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import hashlib
+
+class FileWatcher():
+	"""Detects changes of a file by polling. A cheap stat() decides whether
+	the file may have changed; only then its content is read and hashed, so
+	that merely touching a file is not considered a change."""
+
+	def __init__(self, filename):
+		self._filename = filename
+		self._statkey = None
+		self._digest = None
+
+	def getfilename(self):
+		return self._filename
+
+	def poll(self):
+		"""Returns the file content (as bytes) if it changed since the last
+		call or None otherwise. The very first call always returns the
+		content."""
+		try:
+			stat = os.stat(self._filename)
+		except FileNotFoundError:
+			# Editors may briefly remove the file while saving
+			return None
+		statkey = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+		if statkey == self._statkey:
+			return None
+		self._statkey = statkey
+
+		with open(self._filename, "rb") as f:
+			content = f.read()
+		digest = hashlib.sha256(content).digest()
+		if digest == self._digest:
+			return None
+		self._digest = digest
+		return content
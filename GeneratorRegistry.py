@@ -0,0 +1,63 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import importlib.util
+
+class GeneratorRegistry():
+	"""Knows about all generators within a generator directory. Discovery only
+	lists the directory (every subdirectory with an __init__.py is a
+	generator), the generator modules themselves are imported lazily the first
+	time their Generator class is requested."""
+
+	def __init__(self, gendir):
+		self._gendir = gendir
+		self._generators = { }
+		for name in sorted(os.listdir(gendir)):
+			if os.path.isfile(os.path.join(gendir, name, "__init__.py")):
+				self._generators[name] = None
+
+	def getnames(self):
+		return list(self._generators.keys())
+
+	def select(self, names = None):
+		"""Returns the list of generator names to run. If names is None, these
+		are all generators, otherwise the given names are checked for
+		existence and returned in registry order."""
+		if names is None:
+			return self.getnames()
+		for name in names:
+			if name not in self._generators:
+				raise Exception("No such generator: %s (available are %s)" % (name, ", ".join(self.getnames())))
+		return [ name for name in self.getnames() if name in names ]
+
+	def getgenerator(self, name):
+		"""Imports the generator module (once) and returns its Generator
+		class."""
+		genclass = self._generators[name]
+		if genclass is None:
+			path = os.path.join(self._gendir, name)
+			spec = importlib.util.spec_from_file_location(name, os.path.join(path, "__init__.py"), submodule_search_locations = [ path ])
+			module = importlib.util.module_from_spec(spec)
+			spec.loader.exec_module(module)
+			genclass = module.Generator
+			self._generators[name] = genclass
+		return genclass
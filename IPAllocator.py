@@ -0,0 +1,71 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import heapq
+from IPv4 import IPv4Addr
+
+class IPAllocator():
+	"""Hands out the lowest free address of a network outside of its DHCP
+	range that is not used by any host or server of the network. A cursor
+	moves upwards through the network, so allocating many addresses costs
+	O(1) each; addresses below the cursor that are released again are kept
+	in a heap and handed out first. usedips is any container of the used
+	addresses as integers; the caller adds allocated addresses to it."""
+
+	def __init__(self, network, usedips):
+		net = network.getnet()
+		self._name = network.getname()
+		self._cursor = net.getnet().get() + 1
+		self._last = net.getnet().get() + ((~net.getmask().get()) & 0xffffffff) - 1
+		self._reserved = network.getreservedips()
+		if network.hasdhcp():
+			self._dhcprange = (network.getdhcp().getrangefrom().get(), network.getdhcp().getrangeto().get())
+		else:
+			self._dhcprange = (1, 0)
+		self._usedips = usedips
+		self._released = [ ]
+
+	def isassignable(self, ip):
+		"""Returns True if the IPv4Addr may be assigned to a host at all, i.e.
+		it is neither part of the DHCP range nor used by a router or
+		server (whether it is used by another host is not checked)."""
+		return (not (self._dhcprange[0] <= ip.get() <= self._dhcprange[1])) and (ip.get() not in self._reserved)
+
+	def allocate(self):
+		while (len(self._released) > 0) and (self._released[0] in self._usedips):
+			heapq.heappop(self._released)
+		while self._cursor <= self._last:
+			if self._dhcprange[0] <= self._cursor <= self._dhcprange[1]:
+				self._cursor = self._dhcprange[1] + 1
+			elif (self._cursor in self._usedips) or (self._cursor in self._reserved):
+				self._cursor += 1
+			else:
+				break
+		if (len(self._released) > 0) and ((self._cursor > self._last) or (self._released[0] < self._cursor)):
+			return IPv4Addr().setdecimal(heapq.heappop(self._released))
+		if self._cursor > self._last:
+			raise Exception("No free IP address left in network %s" % (self._name))
+		self._cursor += 1
+		return IPv4Addr().setdecimal(self._cursor - 1)
+
+	def release(self, ip):
+		if ip < self._cursor:
+			heapq.heappush(self._released, ip)
@@ -110,8 +110,15 @@ class IPv4Network(Comparable):
 		return self._mask
 
 	def getrevrepr(self):
-		assert(self.getcidr() in [ 8, 16, 24 ])
-		split = self._net.revrepr().split(".")[-self.getcidr() // 8:]
+		"""Returns the reverse zone name (without "in-addr.arpa") of /8, /16
+		and /24 networks. For networks smaller than a /24, the RFC 2317
+		classless name "<first octet>-<cidr>.<parent /24>" is returned."""
+		cidr = self.getcidr()
+		if (cidr is not None) and (cidr > 24):
+			split = self._net.revrepr().split(".")
+			return "%s-%d.%s" % (split[0], cidr, ".".join(split[1:]))
+		assert(cidr in [ 8, 16, 24 ])
+		split = self._net.revrepr().split(".")[-cidr // 8:]
 		return ".".join(split)
 
 	def _required(self, condition):
@@ -0,0 +1,176 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import sys
+import mmap
+import array
+import struct
+from IPv4 import IPv4Addr
+
+class InventoryExport():
+	"""Writes the hosts and networks of a validated ConfigModel as fixed-width
+	little-endian columns that consumers can memory-map and use without any
+	parsing. The file starts with a header
+
+		magic "NCINVENT", version, host count, network count, column count
+		(all uint32 except the magic)
+
+	followed by one descriptor per column
+
+		name (8 bytes, NUL-padded), dtype (4 bytes, numpy notation such as
+		"<u4", NUL-padded), item count (uint64), file offset (uint64)
+
+	and the column data, each column aligned to 8 bytes. Hosts are sorted by
+	IP address and networks by network address. The columns are:
+
+		hostip		<u4		IP address of each host
+		hostmac		<u8		MAC address of each host
+		hostnet		<u4		index of the host's network in the net* columns
+		hostname	<u4		hostcount + 1 offsets into the names blob;
+							the name of host i is names[hostname[i]:hostname[i + 1]]
+		netaddr		<u4		network address of each network
+		netcidr		<u4		prefix length of each network
+		netname		<u4		networkcount + 1 offsets into the names blob
+		names		|u1		UTF-8 encoded host and network names
+
+	With numpy, a column is np.frombuffer(data, dtype, count, offset)."""
+	_MAGIC = b"NCINVENT"
+	_VERSION = 1
+	_HEADER = struct.Struct("<8sIIII")
+	_DESCRIPTOR = struct.Struct("<8s4sQQ")
+	_ALIGNMENT = 8
+
+	def __init__(self, model):
+		self._networks = sorted(model.getnetworks())
+		self._hosts = sorted(model.gethosts(), key = lambda host: host.getip().get())
+
+	@staticmethod
+	def _column(typecode, values):
+		column = array.array(typecode, values)
+		if sys.byteorder != "little":
+			column.byteswap()
+		return column.tobytes()
+
+	def _getcolumns(self):
+		netindex = { network: index for (index, network) in enumerate(self._networks) }
+		blob = bytearray()
+		def nameoffsets(names):
+			offsets = [ len(blob) ]
+			for name in names:
+				blob.extend(name.encode("utf-8"))
+				offsets.append(len(blob))
+			return offsets
+
+		macvalue = lambda mac: int.from_bytes(bytes(mac.cmpkey()), "big")
+		columns = [
+			("hostip",		"<u4",	self._column("I", (host.getip().get() for host in self._hosts))),
+			("hostmac",		"<u8",	self._column("Q", (macvalue(host.getmac()) for host in self._hosts))),
+			("hostnet",		"<u4",	self._column("I", (netindex[host.getnetwork()] for host in self._hosts))),
+			("hostname",	"<u4",	self._column("I", nameoffsets(host.getname() for host in self._hosts))),
+			("netaddr",		"<u4",	self._column("I", (network.getnet().getnet().get() for network in self._networks))),
+			("netcidr",		"<u4",	self._column("I", (network.getnet().getcidr() for network in self._networks))),
+			("netname",		"<u4",	self._column("I", nameoffsets(network.getname() for network in self._networks))),
+		]
+		columns.append(("names", "|u1", bytes(blob)))
+		return columns
+
+	def write(self, f):
+		"""Writes the export to the binary file-like object f."""
+		columns = self._getcolumns()
+		offset = self._HEADER.size + len(columns) * self._DESCRIPTOR.size
+		header = [ self._HEADER.pack(self._MAGIC, self._VERSION, len(self._hosts), len(self._networks), len(columns)) ]
+		layout = [ ]
+		for (name, dtype, data) in columns:
+			offset += -offset % self._ALIGNMENT
+			itemsize = int(dtype[2:])
+			header.append(self._DESCRIPTOR.pack(name.encode("ascii"), dtype.encode("ascii"), len(data) // itemsize, offset))
+			layout.append((offset, data))
+			offset += len(data)
+
+		position = 0
+		for chunk in header:
+			f.write(chunk)
+			position += len(chunk)
+		for (offset, data) in layout:
+			f.write(bytes(offset - position))
+			f.write(data)
+			position = offset + len(data)
+
+	def writefile(self, filename):
+		with open(filename, "wb") as f:
+			self.write(f)
+
+class InventoryMap():
+	"""Memory-maps a file written by InventoryExport. Columns are returned as
+	memoryviews into the mapping, so nothing is parsed or copied until
+	individual values are accessed."""
+	_TYPECODES = { "<u4": "I", "<u8": "Q", "|u1": "B" }
+
+	def __init__(self, filename):
+		with open(filename, "rb") as f:
+			self._map = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		self._data = memoryview(self._map)
+		(magic, version, self._hostcount, self._networkcount, columncount) = InventoryExport._HEADER.unpack_from(self._data)
+		if (magic != InventoryExport._MAGIC) or (version != InventoryExport._VERSION):
+			raise Exception("%s is no networkconfig inventory export of version %d" % (filename, InventoryExport._VERSION))
+		if sys.byteorder != "little":
+			raise Exception("Memory-mapped inventory columns require a little-endian machine")
+		self._columns = { }
+		for i in range(columncount):
+			(name, dtype, count, offset) = InventoryExport._DESCRIPTOR.unpack_from(self._data, InventoryExport._HEADER.size + i * InventoryExport._DESCRIPTOR.size)
+			dtype = dtype.rstrip(b"\x00").decode("ascii")
+			itemsize = int(dtype[2:])
+			self._columns[name.rstrip(b"\x00").decode("ascii")] = self._data[offset : offset + count * itemsize].cast(self._TYPECODES[dtype])
+
+	def gethostcount(self):
+		return self._hostcount
+
+	def getnetworkcount(self):
+		return self._networkcount
+
+	def getcolumn(self, name):
+		return self._columns[name]
+
+	def _name(self, offsets, index):
+		return bytes(self._columns["names"][offsets[index] : offsets[index + 1]]).decode("utf-8")
+
+	def getnetwork(self, index):
+		"""Returns the tuple (name, subnet) of the network with the given
+		index, with the subnet as a string such as "192.168.1.0/24"."""
+		address = IPv4Addr().setdecimal(self._columns["netaddr"][index])
+		return (self._name(self._columns["netname"], index), "%s/%d" % (address, self._columns["netcidr"][index]))
+
+	def gethost(self, index):
+		"""Returns the tuple (name, ip, mac, networkname) of the host with the
+		given index, all as strings."""
+		mac = self._columns["hostmac"][index].to_bytes(6, "big")
+		return (
+			self._name(self._columns["hostname"], index),
+			str(IPv4Addr().setdecimal(self._columns["hostip"][index])),
+			":".join("%02x" % (x) for x in mac),
+			self.getnetwork(self._columns["hostnet"][index])[0],
+		)
+
+	def close(self):
+		for column in self._columns.values():
+			column.release()
+		self._data.release()
+		self._map.close()
@@ -0,0 +1,221 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import re
+import calendar
+from XMLParser import XMLNode
+from ConfigIndex import ConfigIndex
+from IPAllocator import IPAllocator
+from Representation import validdnsname
+from IPv4 import IPv4Addr
+from Ethernet import MacAddress
+
+class LeaseImporter():
+	"""Turns the leases of ISC dhcpd lease files into new <host> entries of an
+	existing configuration. Lease files are read line by line and only the
+	newest lease of every MAC address is kept, so memory use depends on the
+	number of distinct clients, not on the length of the lease history.
+	Leases that are not in an accepted binding state, whose MAC address is
+	already configured, whose IP address is outside all networks or already
+	taken by a configured host are skipped and reported by getskipped().
+	Leases of addresses that cannot be fixed host addresses, i.e. ones from
+	the dynamic DHCP range (where dhcpd could hand them to another client) or
+	of routers and servers, are given the lowest free address outside of the
+	range instead; getreassigned() reports these. Hostnames are taken from
+	the lease if they are valid and unique within the network, otherwise they
+	are derived from the IP address."""
+	_STATEMENT_RE = re.compile(r"\s*(starts|hardware ethernet|binding state|client-hostname)\s+(.*?);")
+	_DEFAULT_STATES = ( "active", "static" )
+
+	def __init__(self, model, states = _DEFAULT_STATES):
+		"""Only clients whose newest lease is in one of the given binding
+		states are imported (leases without binding state, as written by old
+		dhcpd versions, count as active). By default these are the active and
+		static ones, i.e. not the free, expired, released, abandoned or backup
+		leases of clients that are long gone."""
+		self._index = ConfigIndex(model)
+		self._states = frozenset(states)
+		# MAC cmpkey -> (starts, IPv4Addr, MacAddress, hostname, binding state)
+		self._leases = { }
+		self._leasecount = 0
+		self._hosts = None
+		self._skipped = [ ]
+		self._reassigned = [ ]
+
+	@staticmethod
+	def _parsetime(value):
+		"""Converts the time of a lease statement ("4 2019/01/03 10:00:00" in
+		UTC or "epoch 1546509600") to seconds since the epoch."""
+		fields = value.split()
+		if (len(fields) >= 2) and (fields[0] == "epoch"):
+			return int(fields[1])
+		if (len(fields) == 3) and (fields[0] != "never"):
+			(year, month, day) = (int(x) for x in fields[1].split("/"))
+			(hour, minute, second) = (int(x) for x in fields[2].split(":"))
+			return calendar.timegm((year, month, day, hour, minute, second))
+		return 0
+
+	def _addlease(self, ip, lease):
+		self._leasecount += 1
+		if "hardware ethernet" not in lease:
+			return
+		mac = MacAddress(lease["hardware ethernet"])
+		starts = self._parsetime(lease.get("starts", ""))
+		previous = self._leases.get(mac.cmpkey())
+		# dhcpd appends to its lease file, so later entries win ties
+		if (previous is None) or (starts >= previous[0]):
+			self._leases[mac.cmpkey()] = (starts, IPv4Addr(ip), mac, lease.get("client-hostname", "").strip("\""), lease.get("binding state", "active"))
+		self._hosts = None
+
+	def readleases(self, f):
+		"""Reads all leases from the text file-like object f."""
+		(ip, lease) = (None, None)
+		for (lineno, line) in enumerate(f, 1):
+			line = line.split("#", 1)[0].strip()
+			if line == "":
+				continue
+			if ip is None:
+				if line.startswith("lease ") and line.endswith("{"):
+					(ip, lease) = (line[6:-1].strip(), { })
+			elif line == "}":
+				try:
+					self._addlease(ip, lease)
+				except Exception as e:
+					raise Exception("Invalid lease for %s ending in line %d: %s" % (ip, lineno, str(e)))
+				(ip, lease) = (None, None)
+			else:
+				match = self._STATEMENT_RE.match(line)
+				if match is not None:
+					lease[match.group(1)] = match.group(2).strip()
+
+	def readleasefile(self, filename):
+		with open(filename) as f:
+			self.readleases(f)
+
+	def getleasecount(self):
+		"""Returns the number of leases read, including duplicates."""
+		return self._leasecount
+
+	def _hostname(self, network, ip, clienthostname, usednames):
+		name = re.sub(r"[^a-zA-Z0-9]", "", clienthostname.split(".")[0])
+		if not validdnsname(name):
+			name = "lease%s" % ("".join("%03d" % (int(octet)) for octet in str(ip).split(".")))
+		(candidate, number) = (name, 1)
+		while (network.getname(), candidate) in usednames:
+			number += 1
+			candidate = "%s%d" % (name, number)
+		return candidate
+
+	def _resolve(self):
+		self._skipped = [ ]
+		self._reassigned = [ ]
+		model = self._index.getmodel()
+		usednames = set((host.getnetwork().getname(), host.getname()) for host in model.gethosts())
+		# IP as int -> MAC of the lease that got it; configured hosts are
+		# in there as well (as None), so the allocators see all of them
+		usedips = { host.getip().get(): None for host in model.gethosts() }
+		allocators = { network.getname(): IPAllocator(network, usedips) for network in model.getnetworks() }
+		hosts = [ ]
+		reassign = [ ]
+		# Newest leases first, so they win over older leases of the same IP
+		for (starts, ip, mac, clienthostname, state) in sorted(self._leases.values(), key = lambda lease: -lease[0]):
+			# The newest lease of the MAC decides, e.g. a client that released
+			# its address is not imported with an older active lease
+			if state not in self._states:
+				self._skipped.append((mac, ip, "lease is in binding state %s" % (state)))
+				continue
+			network = self._index.networkof(ip)
+			if network is None:
+				self._skipped.append((mac, ip, "not within any declared network"))
+				continue
+			configured = self._index.bymac(mac)
+			if configured is not None:
+				self._skipped.append((mac, ip, "MAC address already configured for %s" % (self._index.fqdn(configured))))
+				continue
+			configured = self._index.byip(ip)
+			if configured is not None:
+				self._skipped.append((mac, ip, "IP address already used by %s" % (self._index.fqdn(configured))))
+				continue
+			if not allocators[network.getname()].isassignable(ip):
+				# Only after all kept addresses are known, so that none of
+				# them is handed out again
+				reassign.append((ip, mac, clienthostname, network))
+				continue
+			if ip.get() in usedips:
+				self._skipped.append((mac, ip, "IP address was leased to %s more recently" % (usedips[ip.get()])))
+				continue
+			usedips[ip.get()] = mac
+
+			name = self._hostname(network, ip, clienthostname, usednames)
+			usednames.add((network.getname(), name))
+			hosts.append(XMLNode("host", { "name": name, "ip": str(ip), "mac": str(mac) }))
+
+		for (leasedip, mac, clienthostname, network) in reassign:
+			try:
+				ip = allocators[network.getname()].allocate()
+			except Exception as e:
+				self._skipped.append((mac, leasedip, str(e)))
+				continue
+			usedips[ip.get()] = mac
+			self._reassigned.append((mac, leasedip, ip))
+			name = self._hostname(network, ip, clienthostname, usednames)
+			usednames.add((network.getname(), name))
+			hosts.append(XMLNode("host", { "name": name, "ip": str(ip), "mac": str(mac) }))
+		hosts.sort(key = lambda node: IPv4Addr(node["ip"]).get())
+		self._hosts = hosts
+
+	def gethosts(self):
+		"""Returns the new hosts as a list of <host> XMLNodes sorted by IP
+		address."""
+		if self._hosts is None:
+			self._resolve()
+		return self._hosts
+
+	def getskipped(self):
+		"""Returns a list of (MacAddress, IPv4Addr, reason) tuples for all
+		leases that were not imported."""
+		self.gethosts()
+		return self._skipped
+
+	def getreassigned(self):
+		"""Returns a list of (MacAddress, leased IPv4Addr, new IPv4Addr)
+		tuples for all imported leases that were given a new address."""
+		self.gethosts()
+		return self._reassigned
+
+	def writeconfig(self, infile, outfile):
+		"""Copies the XML configuration from the text file-like object infile
+		to outfile line by line and appends the new hosts right before the
+		closing </hosts> tag; everything else is kept as it is."""
+		inserted = False
+		for line in infile:
+			if (not inserted) and ("</hosts>" in line):
+				(head, tail) = line.split("</hosts>", 1)
+				if head.strip() != "":
+					outfile.write(head + "\n")
+				for node in self.gethosts():
+					node.writenode(outfile, pretty = True, indent = 2)
+				outfile.write(head[:len(head) - len(head.lstrip())] + "</hosts>" + tail)
+				inserted = True
+			else:
+				outfile.write(line)
+		if not inserted:
+			raise Exception("No </hosts> closing tag found, cannot append hosts.")
@@ -0,0 +1,118 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import re
+import sys
+import json
+import tracemalloc
+try:
+	import resource
+except ImportError:
+	# Not available on all platforms, peak RSS is then not reported
+	resource = None
+
+class MemoryBudgetExceeded(Exception):
+	pass
+
+class MemoryProfiler():
+	"""Registers as a Profiler hook and takes a checkpoint at the end of the
+	parse phase, the model construction and each generator. If tracing is
+	enabled, every checkpoint holds a tracemalloc snapshot summary: current
+	and peak traced memory since the previous checkpoint and the allocation
+	sites that grew most since then. If a budget is given, the peak RSS is
+	checked at every checkpoint and MemoryBudgetExceeded raised once it is
+	exceeded. Since the peak RSS is a high-water mark, peaks between
+	checkpoints are caught as well."""
+	_CHECKPOINTS = re.compile(r"parse|model|generate/[^/]+")
+
+	def __init__(self, trace = True, budget = None, topcount = 10, frames = 1):
+		self._trace = trace
+		self._budget = budget
+		self._topcount = topcount
+		self._checkpoints = [ ]
+		self._snapshot = None
+		if trace:
+			tracemalloc.start(frames)
+			self._snapshot = self._takesnapshot()
+
+	def attach(self, profiler):
+		profiler.addhook(self._phaseended)
+		return self
+
+	@staticmethod
+	def getpeakrss():
+		"""Returns the peak resident set size of this process in bytes or None
+		if it cannot be determined."""
+		if resource is None:
+			return None
+		maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if sys.platform == "darwin":
+			# Reported in bytes on macOS, in KiB everywhere else
+			return maxrss
+		return maxrss * 1024
+
+	@staticmethod
+	def _takesnapshot():
+		return tracemalloc.take_snapshot().filter_traces([
+			tracemalloc.Filter(False, tracemalloc.__file__),
+			tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+			tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+		])
+
+	def _topsites(self, snapshot):
+		return [ {
+			"site":			"%s:%d" % (stat.traceback[0].filename, stat.traceback[0].lineno),
+			"size":			stat.size,
+			"sizediff":		stat.size_diff,
+			"count":		stat.count,
+			"countdiff":	stat.count_diff,
+		} for stat in snapshot.compare_to(self._snapshot, "lineno")[:self._topcount] ]
+
+	def _phaseended(self, name):
+		if not self._CHECKPOINTS.fullmatch(name):
+			return
+		checkpoint = {
+			"phase":	name,
+			"rsspeak":	self.getpeakrss(),
+		}
+		if self._trace:
+			(current, peak) = tracemalloc.get_traced_memory()
+			checkpoint["traced"] = current
+			checkpoint["tracedpeak"] = peak
+			snapshot = self._takesnapshot()
+			checkpoint["top"] = self._topsites(snapshot)
+			self._snapshot = snapshot
+			tracemalloc.reset_peak()
+		self._checkpoints.append(checkpoint)
+
+		if (self._budget is not None) and (checkpoint["rsspeak"] is not None) and (checkpoint["rsspeak"] > self._budget):
+			raise MemoryBudgetExceeded("Memory budget of %.1f MiB exceeded after phase %s: peak RSS is %.1f MiB" % (self._budget / 1024 / 1024, name, checkpoint["rsspeak"] / 1024 / 1024))
+
+	def getreport(self):
+		return {
+			"rsspeak":		self.getpeakrss(),
+			"budget":		self._budget,
+			"checkpoints":	self._checkpoints,
+		}
+
+	def writereport(self, f):
+		json.dump(self.getreport(), f, indent = 4)
+		f.write("\n")
@@ -0,0 +1,361 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import io
+import time
+import tarfile
+import tempfile
+import concurrent.futures
+try:
+	import pwd, grp
+except ImportError:
+	# No user database on this platform, owners are recorded as id 0
+	pwd = grp = None
+
+class _PendingOutput():
+	"""A file that is being rendered but not yet committed. Templates write
+	to it through write(), which is bound directly to the underlying file
+	object to avoid any per-call overhead."""
+	def __init__(self, f, destfilename, perms, usergrp, **kwargs):
+		self.f = f
+		self.write = f.write
+		self.destfilename = destfilename
+		self.perms = perms
+		self.usergrp = usergrp
+		self.__dict__.update(kwargs)
+
+class DirectoryOutput():
+	"""Writes every output into a file below the output directory. Files are
+	written under a temporary name next to their destination and renamed into
+	place on commit, so they are never seen half-written.
+
+	A durable output also survives a crash: committed files are closed and
+	handed to a pool of writer threads, which reopen and fsync them
+	concurrently (so no descriptors are held while files wait for their
+	fsync). Only when the run
+	is finished (sync() or close()), all files are renamed into place and
+	every directory involved is fsynced once. A run therefore costs about one
+	round of (concurrent) fsyncs instead of one fsync after another."""
+	_WRITEBUFSIZE = 1024 * 1024
+
+	def __init__(self, outdir, durable = False, writers = 8):
+		self._outdir = outdir
+		self._fingerprints = { }
+		self._durable = durable
+		self._writers = writers
+		self._pool = None
+		# (future, pending, fingerprint) of committed, not yet renamed files
+		self._queued = [ ]
+
+	def isuptodate(self, destfilename, fingerprint):
+		"""Returns True if the output was committed before with the same
+		fingerprint (during the lifetime of this object) and still exists.
+		Outputs without fingerprint (None) are never up to date."""
+		return (fingerprint is not None) and (self._fingerprints.get(destfilename) == fingerprint) and os.path.exists(self._outdir + destfilename)
+
+	def open(self, destfilename, perms, usergrp):
+		outfilename = self._outdir + destfilename
+		try:
+			os.makedirs(os.path.dirname(outfilename))
+		except OSError:
+			pass
+		tmpfilename = outfilename + ".tmp"
+		f = open(tmpfilename, "w", buffering = self._WRITEBUFSIZE)
+		return _PendingOutput(f, destfilename, perms, usergrp, outfilename = outfilename, tmpfilename = tmpfilename)
+
+	def commit(self, pending, fingerprint = None):
+		"""Finishes the output and returns its size in bytes. A durable output
+		is only queued for fsync here and renamed into place by sync()."""
+		self._fingerprints.pop(pending.destfilename, None)
+		if self._durable:
+			try:
+				pending.f.close()
+				size = os.path.getsize(pending.tmpfilename)
+			except:
+				self.abort(pending)
+				raise
+			self._queued.append((self._getpool().submit(self._syncfile, pending.tmpfilename), pending, fingerprint))
+			return size
+
+		try:
+			pending.f.close()
+			os.replace(pending.tmpfilename, pending.outfilename)
+		except:
+			self.abort(pending)
+			raise
+		if fingerprint is not None:
+			self._fingerprints[pending.destfilename] = fingerprint
+		return os.path.getsize(pending.outfilename)
+
+	def abort(self, pending):
+		pending.f.close()
+		if os.path.exists(pending.tmpfilename):
+			os.unlink(pending.tmpfilename)
+
+	def _getpool(self):
+		if self._pool is None:
+			self._pool = concurrent.futures.ThreadPoolExecutor(self._writers)
+		return self._pool
+
+	@staticmethod
+	def _syncfile(filename):
+		fd = os.open(filename, os.O_RDWR)
+		try:
+			os.fsync(fd)
+		finally:
+			os.close(fd)
+
+	@staticmethod
+	def _syncdirectory(dirname):
+		fd = os.open(dirname, os.O_RDONLY)
+		try:
+			os.fsync(fd)
+		finally:
+			os.close(fd)
+
+	def _directories(self, outfilename):
+		"""Yields the directory of the file and all its parents up to (and
+		including) the output directory, whose entries may have changed."""
+		outdir = os.path.abspath(self._outdir)
+		dirname = os.path.dirname(os.path.abspath(outfilename))
+		while True:
+			yield dirname
+			if (dirname == outdir) or (len(dirname) <= len(outdir)) or (os.path.dirname(dirname) == dirname):
+				break
+			dirname = os.path.dirname(dirname)
+
+	def sync(self):
+		"""Finishes the outputs of the current run. For a durable output, this
+		waits for all files to be fsynced, renames them into place and then
+		fsyncs every affected directory once. If any file failed, none is
+		renamed."""
+		(queued, self._queued) = (self._queued, [ ])
+		if len(queued) == 0:
+			return
+		error = None
+		for (future, pending, fingerprint) in queued:
+			try:
+				future.result()
+			except Exception as e:
+				error = error or e
+		if error is not None:
+			for (future, pending, fingerprint) in queued:
+				if os.path.exists(pending.tmpfilename):
+					os.unlink(pending.tmpfilename)
+			raise error
+
+		directories = set()
+		for (future, pending, fingerprint) in queued:
+			os.replace(pending.tmpfilename, pending.outfilename)
+			directories.update(self._directories(pending.outfilename))
+			if fingerprint is not None:
+				self._fingerprints[pending.destfilename] = fingerprint
+		if os.name == "posix":
+			# Directories cannot be opened (and synced) on all platforms
+			list(self._getpool().map(self._syncdirectory, sorted(directories)))
+
+	def suspend(self):
+		"""Waits for the writer threads to finish the queued fsyncs and stops
+		them, so that the process can safely be forked. They are restarted
+		by the next commit. Queued files are still only renamed by sync()."""
+		if self._pool is not None:
+			self._pool.shutdown()
+			self._pool = None
+
+	def close(self):
+		self.sync()
+		self.suspend()
+
+class MemoryOutput():
+	"""Keeps all outputs in memory. After generation, getfiles() returns a
+	dictionary mapping every destination filename to its content."""
+
+	def __init__(self):
+		self._files = { }
+
+	def open(self, destfilename, perms, usergrp):
+		return _PendingOutput(io.StringIO(), destfilename, perms, usergrp)
+
+	def isuptodate(self, destfilename, fingerprint):
+		return False
+
+	def commit(self, pending, fingerprint = None):
+		content = pending.f.getvalue()
+		self._files[pending.destfilename] = content
+		return len(content.encode("utf-8"))
+
+	def abort(self, pending):
+		pass
+
+	def getfiles(self):
+		return self._files
+
+	def sync(self):
+		pass
+
+	def suspend(self):
+		pass
+
+	def close(self):
+		pass
+
+class PlanOutput():
+	"""Renders nothing, but records which outputs a generator run would
+	create and their fingerprints (None for outputs without fingerprint).
+	Every output is reported as up to date, so the Controller skips
+	rendering it. getfingerprints() returns a dictionary that maps every
+	destination filename to its fingerprint."""
+
+	def __init__(self):
+		self._fingerprints = { }
+
+	def isuptodate(self, destfilename, fingerprint):
+		self._fingerprints[destfilename] = fingerprint
+		return True
+
+	def open(self, destfilename, perms, usergrp):
+		return _PendingOutput(io.StringIO(), destfilename, perms, usergrp)
+
+	def commit(self, pending, fingerprint = None):
+		self._fingerprints[pending.destfilename] = fingerprint
+		return 0
+
+	def abort(self, pending):
+		pass
+
+	def getfingerprints(self):
+		return self._fingerprints
+
+	def sync(self):
+		pass
+
+	def suspend(self):
+		pass
+
+	def close(self):
+		pass
+
+class CallbackOutput():
+	"""Hands every finished output to a callback function, which is called as
+	callback(destfilename, content, perms, usergrp)."""
+
+	def __init__(self, callback):
+		self._callback = callback
+
+	def open(self, destfilename, perms, usergrp):
+		return _PendingOutput(io.StringIO(), destfilename, perms, usergrp)
+
+	def isuptodate(self, destfilename, fingerprint):
+		return False
+
+	def commit(self, pending, fingerprint = None):
+		content = pending.f.getvalue()
+		self._callback(pending.destfilename, content, pending.perms, pending.usergrp)
+		return len(content.encode("utf-8"))
+
+	def abort(self, pending):
+		pass
+
+	def sync(self):
+		pass
+
+	def suspend(self):
+		pass
+
+	def close(self):
+		pass
+
+class TarOutput():
+	"""Streams all outputs into a single (optionally compressed) tar archive,
+	recording the requested permissions and owner of every file. Since a tar
+	header needs the file size, each output is spooled (in memory up to a
+	limit, then in a temporary file) and appended to the archive on commit.
+	The archive is written strictly sequentially, so it may also go to a
+	pipe."""
+	_SPOOLSIZE = 16 * 1024 * 1024
+
+	def __init__(self, f, compression = None, closefile = False):
+		self._f = f
+		self._closefile = closefile
+		self._tar = tarfile.open(fileobj = f, mode = "w|" + (compression or ""))
+		self._mtime = time.time()
+
+	@classmethod
+	def tofile(cls, filename, compression = None):
+		return cls(open(filename, "wb"), compression, closefile = True)
+
+	@staticmethod
+	def _lookupid(name, database):
+		"""Resolves a user or group name to its numeric id. Numeric names are
+		taken as-is, unknown names (or no user database) give 0."""
+		if name.isdigit():
+			return int(name)
+		if database is None:
+			return 0
+		try:
+			return database(name)[2]
+		except KeyError:
+			return 0
+
+	def isuptodate(self, destfilename, fingerprint):
+		return False
+
+	def open(self, destfilename, perms, usergrp):
+		spool = tempfile.SpooledTemporaryFile(max_size = self._SPOOLSIZE)
+		f = io.TextIOWrapper(spool, encoding = "utf-8")
+		return _PendingOutput(f, destfilename, perms, usergrp)
+
+	def commit(self, pending, fingerprint = None):
+		"""Appends the output to the archive and returns its size in bytes."""
+		pending.f.flush()
+		spool = pending.f.detach()
+		try:
+			(user, _, group) = pending.usergrp.partition(":")
+			info = tarfile.TarInfo(pending.destfilename.lstrip("/"))
+			info.size = spool.tell()
+			info.mode = pending.perms
+			info.mtime = self._mtime
+			info.uname = user
+			info.gname = group or user
+			info.uid = self._lookupid(info.uname, pwd.getpwnam if (pwd is not None) else None)
+			info.gid = self._lookupid(info.gname, grp.getgrnam if (grp is not None) else None)
+			spool.seek(0)
+			self._tar.addfile(info, spool)
+		finally:
+			spool.close()
+		return info.size
+
+	def abort(self, pending):
+		pending.f.close()
+
+	def sync(self):
+		pass
+
+	def suspend(self):
+		pass
+
+	def close(self):
+		self._tar.close()
+		if self._closefile:
+			self._f.close()
+		else:
+			self._f.flush()
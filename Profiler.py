@@ -0,0 +1,104 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import time
+import json
+import contextlib
+
+class Profiler():
+	"""Accumulates wall clock time, CPU time and call counts of named phases
+	as well as arbitrary counters. Phase names are hierarchical strings
+	separated by '/', e.g. "generate/bind9/render". A disabled profiler
+	records nothing and adds next to no overhead. Hooks that are called at
+	the end of every phase can be registered regardless of whether timing is
+	enabled."""
+
+	def __init__(self, enabled = True):
+		self._enabled = enabled
+		self._phases = { }
+		self._counters = { }
+		self._hooks = [ ]
+		self._start = (time.perf_counter(), time.process_time())
+
+	def addhook(self, hook):
+		"""Registers hook(name), which is called whenever a phase completed
+		without raising an exception."""
+		self._hooks.append(hook)
+
+	def isenabled(self):
+		return self._enabled
+
+	@contextlib.contextmanager
+	def phase(self, name):
+		"""Context manager that accounts the time spent within it to the phase
+		with the given name. Phases may be entered more than once, their times
+		and the number of calls are then summed up."""
+		if not self._enabled:
+			yield
+			for hook in self._hooks:
+				hook(name)
+			return
+
+		(wall, cpu) = (time.perf_counter(), time.process_time())
+		try:
+			yield
+		finally:
+			(wall, cpu) = (time.perf_counter() - wall, time.process_time() - cpu)
+			entry = self._phases.get(name)
+			if entry is None:
+				entry = { "wall": 0, "cpu": 0, "calls": 0 }
+				self._phases[name] = entry
+			entry["wall"] += wall
+			entry["cpu"] += cpu
+			entry["calls"] += 1
+		for hook in self._hooks:
+			hook(name)
+
+	def count(self, name, value = 1):
+		"""Adds value to the counter with the given name."""
+		if self._enabled:
+			self._counters[name] = self._counters.get(name, 0) + value
+
+	def getreport(self):
+		"""Returns the collected data as a JSON-serializable dictionary."""
+		return {
+			"total": {
+				"wall":		time.perf_counter() - self._start[0],
+				"cpu":		time.process_time() - self._start[1],
+			},
+			"phases":	self._phases,
+			"counts":	self._counters,
+		}
+
+	def writereport(self, f):
+		json.dump(self.getreport(), f, indent = 4, sort_keys = True)
+		f.write("\n")
+
+if __name__ == "__main__":
+	import sys
+	profiler = Profiler()
+	for i in range(3):
+		with profiler.phase("outer"):
+			with profiler.phase("outer/inner"):
+				sum(range(100000))
+	profiler.count("items", 3)
+	assert(profiler.getreport()["phases"]["outer"]["calls"] == 3)
+	profiler.writereport(sys.stdout)
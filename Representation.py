@@ -20,6 +20,8 @@
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
 import re
+import heapq
+import itertools
 from IPv4 import IPv4Addr, IPv4Network
 from Ethernet import MacAddress
 from Comparable import Comparable
@@ -32,36 +34,48 @@ _dns_hinfo_re = re.compile(r"[-_a-zA-Z0-9/ ]+")
 def validdnshinfoentry(text):
 	return _dns_hinfo_re.fullmatch(text) is not None
 
+_tag_re = re.compile(r"[a-zA-Z][-_a-zA-Z0-9]*")
+def validtag(text):
+	return _tag_re.fullmatch(text) is not None
+
 _dns_txt_re = re.compile(r"[-/=()+a-zA-Z0-9 @\.]+")
 def validdnstxtentry(text):
 	return _dns_txt_re.fullmatch(text) is not None
 
 class DNSInfo():
 	def __init__(self, xmlroot, xmlnode):
-		if xmlnode.getchild("hinfo"):
-			self._hinfo = (xmlnode.hinfo["arch"], xmlnode.hinfo["os"])
+		hinfo = (xmlnode.hinfo["arch"], xmlnode.hinfo["os"]) if xmlnode.getchild("hinfo") else None
+		texts = [ textnode["value"] for textnode in xmlnode.text ] if xmlnode.getchild("text") else [ ]
+		cnames = [ cnamenode["name"] for cnamenode in xmlnode.cname ] if xmlnode.getchild("cname") else [ ]
+		self._setup(hinfo, texts, cnames)
+
+	@classmethod
+	def fromvalues(cls, hinfo, texts, cnames):
+		"""Creates the DNS information from plain values instead of an XML
+		node: hinfo as (arch, os) tuple or None and lists of strings."""
+		dnsinfo = cls.__new__(cls)
+		dnsinfo._setup(hinfo, texts, cnames)
+		return dnsinfo
+
+	def _setup(self, hinfo, texts, cnames):
+		self._hinfo = hinfo
+		if self._hinfo is not None:
 			if not validdnshinfoentry(self._hinfo[0]):
 				raise Exception("'%s' is no valid HINFO architecture entry" % (self._hinfo[0]))
 			if not validdnshinfoentry(self._hinfo[1]):
 				raise Exception("'%s' is no valid HINFO operating system entry" % (self._hinfo[1]))
-		else:
-			self._hinfo = None
 
 		self._text = [ ]
-		if xmlnode.getchild("text"):
-			for textnode in xmlnode.text:
-				text = textnode["value"]
-				if not validdnstxtentry(text):
-					raise Exception("'%s' is no valid TXT entry" % (text))
-				self._text.append(text)
+		for text in texts:
+			if not validdnstxtentry(text):
+				raise Exception("'%s' is no valid TXT entry" % (text))
+			self._text.append(text)
 
 		self._cnames = [ ]
-		if xmlnode.getchild("cname"):
-			for cnamenode in xmlnode.cname:
-				cname = cnamenode["name"]
-				if not validdnsname(cname):
-					raise Exception("'%s' is no valid CNAME entry" % (cname))
-				self._cnames.append(cname)
+		for cname in cnames:
+			if not validdnsname(cname):
+				raise Exception("'%s' is no valid CNAME entry" % (cname))
+			self._cnames.append(cname)
 
 	def hashinfo(self):
 		return self._hinfo is not None
@@ -78,39 +92,48 @@ class DNSInfo():
 	def getcnames(self):
 		return iter(self._cnames)
 
+	def getfingerprint(self):
+		return (self._hinfo, tuple(self._text), tuple(self._cnames))
+
 class DHCPInfo():
 	def __init__(self, xmlroot, xmlnode):
-		self._range = (IPv4Addr(xmlnode.range["from"]), IPv4Addr(xmlnode.range["to"]))
-		if xmlnode.getchild("broadcast"):
-			self._broadcast = IPv4Addr(xmlnode.broadcast["ip"])
-		else:
-			self._broadcast = None
-
-		self._dnsserver = [ ]
-		if xmlnode.getchild("dnsserver"):
-			for dnsserver in xmlnode.dnsserver:
-				self._dnsserver.append(IPv4Addr(dnsserver["ip"]))
-
-		if xmlnode.getchild("router"):
-			self._router = IPv4Addr(xmlnode.router["ip"])
-		else:
-			self._router = None
-
-		self._ntpserver = [ ]
-		if xmlnode.getchild("ntpserver"):
-			for ntpserver in xmlnode.ntpserver:
-				self._ntpserver.append(IPv4Addr(ntpserver["ip"]))
-
-		if xmlnode.getchild("leasetime"):
-			self._leasetimedefault = int(xmlnode.leasetime["default"])
-			self._leasetimemax = int(xmlnode.leasetime["max"])
+		self._setup(
+			(xmlnode.range["from"], xmlnode.range["to"]),
+			xmlnode.broadcast["ip"] if xmlnode.getchild("broadcast") else None,
+			[ dnsserver["ip"] for dnsserver in xmlnode.dnsserver ] if xmlnode.getchild("dnsserver") else [ ],
+			xmlnode.router["ip"] if xmlnode.getchild("router") else None,
+			[ ntpserver["ip"] for ntpserver in xmlnode.ntpserver ] if xmlnode.getchild("ntpserver") else [ ],
+			(xmlnode.leasetime["default"], xmlnode.leasetime["max"]) if xmlnode.getchild("leasetime") else None,
+			(xmlnode.pxe["filename"], xmlnode.pxe["next"]) if xmlnode.getchild("pxe") else None,
+		)
+
+	@classmethod
+	def fromvalues(cls, dhcprange, broadcast, dnsservers, router, ntpservers, leasetime, pxe):
+		"""Creates the DHCP information from plain (string) values instead of
+		an XML node: dhcprange as (from, to), leasetime as (default, max) and
+		pxe as (filename, next) tuple; missing values are None or empty
+		lists."""
+		dhcpinfo = cls.__new__(cls)
+		dhcpinfo._setup(dhcprange, broadcast, dnsservers, router, ntpservers, leasetime, pxe)
+		return dhcpinfo
+
+	def _setup(self, dhcprange, broadcast, dnsservers, router, ntpservers, leasetime, pxe):
+		self._range = (IPv4Addr(dhcprange[0]), IPv4Addr(dhcprange[1]))
+		self._broadcast = IPv4Addr(broadcast) if (broadcast is not None) else None
+		self._dnsserver = [ IPv4Addr(ip) for ip in dnsservers ]
+		self._router = IPv4Addr(router) if (router is not None) else None
+		self._ntpserver = [ IPv4Addr(ip) for ip in ntpservers ]
+
+		if leasetime is not None:
+			self._leasetimedefault = int(leasetime[0])
+			self._leasetimemax = int(leasetime[1])
 		else:
 			self._leasetimedefault = None
 			self._leasetimemax = None
 
-		if xmlnode.getchild("pxe"):
-			self._pxefilename = xmlnode.pxe["filename"]
-			self._pxenext = IPv4Addr(xmlnode.pxe["next"])
+		if pxe is not None:
+			self._pxefilename = pxe[0]
+			self._pxenext = IPv4Addr(pxe[1])
 		else:
 			self._pxefilename = None
 			self._pxenext = None
@@ -145,24 +168,64 @@ class DHCPInfo():
 	def getpxenext(self):
 		return self._pxenext
 
+	def getfingerprint(self):
+		ipvalue = lambda ip: ip.get() if (ip is not None) else None
+		return (
+			(self._range[0].get(), self._range[1].get()),
+			ipvalue(self._broadcast),
+			tuple(ip.get() for ip in self._dnsserver),
+			ipvalue(self._router),
+			tuple(ip.get() for ip in self._ntpserver),
+			self._leasetimedefault, self._leasetimemax,
+			self._pxefilename, ipvalue(self._pxenext),
+		)
+
 class DNSServerInfo():
 	def __init__(self, xmlroot, xmlnode):
 		self._authority = IPv4Addr(xmlnode.authority["ip"])
 
+	@classmethod
+	def fromvalues(cls, authority):
+		dnsserverinfo = cls.__new__(cls)
+		dnsserverinfo._authority = IPv4Addr(authority)
+		return dnsserverinfo
+
 	def getauthority(self):
 		return self._authority
 
+	def getfingerprint(self):
+		return self._authority.get()
+
 class Host(Comparable):
 	def __init__(self, xmlroot, xmlnode):
-		self._name = xmlnode["name"]
-		if not validdnsname(self._name):
-			raise Exception("%s is no valid hostname" % (self._name))
-		self._ip = IPv4Addr(xmlnode["ip"])
-		self._mac = MacAddress(xmlnode["mac"])
+		self._setup(xmlnode["name"], xmlnode["ip"], xmlnode["mac"], xmlnode.get("tags", ""), xmlnode.get("group"), xmlnode.getlinenumber())
 		if xmlnode.getchild("dns") is not None:
 			self._dns = DNSInfo(xmlroot, xmlnode.dns)
-		else:
-			self._dns = None
+
+	@classmethod
+	def fromvalues(cls, name, ip, mac, tags = "", group = None, dns = None, linenumber = None):
+		"""Creates a host from plain (string) values instead of an XML node;
+		tags are comma-separated and dns is a DNSInfo or None."""
+		host = cls.__new__(cls)
+		host._setup(name, ip, mac, tags, group, linenumber)
+		host._dns = dns
+		return host
+
+	def _setup(self, name, ip, mac, tags, group, linenumber):
+		self._name = name
+		if not validdnsname(self._name):
+			raise Exception("%s is no valid hostname" % (self._name))
+		self._ip = IPv4Addr(ip)
+		self._mac = MacAddress(mac)
+		self._tags = frozenset(tag.strip() for tag in tags.split(",") if (tag.strip() != ""))
+		for tag in self._tags:
+			if not validtag(tag):
+				raise Exception("%s is no valid tag of host %s" % (tag, self._name))
+		self._group = group
+		if (self._group is not None) and (not validtag(self._group)):
+			raise Exception("%s is no valid group of host %s" % (self._group, self._name))
+		self._linenumber = linenumber
+		self._dns = None
 		self._network = None
 
 	def cmpkey(self):
@@ -174,6 +237,11 @@ class Host(Comparable):
 	def getname(self):
 		return self._name
 
+	def getlinenumber(self):
+		"""Returns the line of the configuration file the host was declared
+		in or None if it is unknown."""
+		return self._linenumber
+
 	def getip(self):
 		return self._ip
 
@@ -183,6 +251,17 @@ class Host(Comparable):
 	def getdns(self):
 		return self._dns
 
+	def gettags(self):
+		"""Returns the (frozen) set of tags of the host."""
+		return self._tags
+
+	def hastag(self, tag):
+		return tag in self._tags
+
+	def getgroup(self):
+		"""Returns the name of the group the host belongs to or None."""
+		return self._group
+
 	def getnetwork(self):
 		return self._network
 
@@ -190,19 +269,189 @@ class Host(Comparable):
 		assert((self._network is None) and (network is not None))
 		self._network = network
 
+	def getfingerprint(self):
+		"""Returns a value that compares equal for hosts with identical
+		attributes, tags and DNS records (the network is not part of it)."""
+		return (self._name, self._ip.get(), self._mac.cmpkey(), tuple(sorted(self._tags)), self._group, self._dns.getfingerprint() if (self._dns is not None) else None)
+
+class HostRange():
+	"""A run of homogeneous hosts declared by a single <hostrange> element,
+	e.g. prefix "node", 4 digits, first number 1 and a count of 4096 for the
+	hosts node0001 to node4096. Hosts have consecutive IP and MAC addresses,
+	starting at the given ones. The hosts are not stored but created as Host
+	views on demand, so a range costs the same regardless of its size and
+	can be checked as one interval of IP and MAC addresses."""
+	_name_re = re.compile(r"(.*?)([0-9]+)")
+
+	def __init__(self, xmlroot, xmlnode):
+		self._setup(xmlnode["prefix"], xmlnode.get("digits", "0"), xmlnode.get("first", "1"), xmlnode["count"], xmlnode["ip"], xmlnode["mac"], xmlnode.get("tags", ""), xmlnode.get("group"), xmlnode.getlinenumber())
+
+	@classmethod
+	def fromvalues(cls, prefix, digits, first, count, ip, mac, tags = "", group = None, linenumber = None):
+		hostrange = cls.__new__(cls)
+		hostrange._setup(prefix, digits, first, count, ip, mac, tags, group, linenumber)
+		return hostrange
+
+	def _setup(self, prefix, digits, first, count, ip, mac, tags, group, linenumber):
+		self._prefix = prefix
+		(self._digits, self._first, self._count) = (int(digits), int(first), int(count))
+		if (self._count < 1) or (self._first < 0) or (self._digits < 0):
+			raise Exception("Host range %s needs a positive count and a non-negative first number and digits" % (prefix))
+		self._ip = IPv4Addr(ip).get()
+		self._mac = MacAddress(mac).toint()
+		if self._ip + self._count - 1 > 0xffffffff:
+			raise Exception("IP addresses of host range %s exceed 255.255.255.255" % (prefix))
+		if self._mac + self._count - 1 > 0xffffffffffff:
+			raise Exception("MAC addresses of host range %s exceed ff:ff:ff:ff:ff:ff" % (prefix))
+		# Host names are validated through the first one (with the widest
+		# possible number of digits all others are valid as well)
+		if not validdnsname(self._prefix + "0"):
+			raise Exception("%s is no valid hostname prefix" % (self._prefix))
+		# Names are compared by splitting off their trailing number, which
+		# only finds the range if the prefix itself does not end in a digit
+		if self._prefix[-1].isdigit():
+			raise Exception("Host range prefix %s must not end in a digit" % (self._prefix))
+		# Views are created by the Host constructor, which validates tags
+		self._tags = tags
+		self._group = group
+		Host.fromvalues(self.getname(0), ip, mac, tags, group)
+		self._linenumber = linenumber
+		self._network = None
+
+	def __len__(self):
+		return self._count
+
+	def getcount(self):
+		return self._count
+
+	def getprefix(self):
+		return self._prefix
+
+	def getlinenumber(self):
+		return self._linenumber
+
+	def getname(self, index):
+		return "%s%0*d" % (self._prefix, self._digits, self._first + index)
+
+	def getiprange(self):
+		"""Returns the first and last IP address as integers."""
+		return (self._ip, self._ip + self._count - 1)
+
+	def getmacrange(self):
+		"""Returns the first and last MAC address as integers."""
+		return (self._mac, self._mac + self._count - 1)
+
+	def getnumberrange(self):
+		return (self._first, self._first + self._count - 1)
+
+	def hastagsorgroup(self):
+		return (self._tags.strip() != "") or (self._group is not None)
+
+	def getnetwork(self):
+		return self._network
+
+	def setnetwork(self, network):
+		assert((self._network is None) and (network is not None))
+		self._network = network
+
+	def gethost(self, index):
+		"""Returns a Host view of the host with the given index."""
+		assert(0 <= index < self._count)
+		host = Host.__new__(Host)
+		host._name = self.getname(index)
+		host._ip = IPv4Addr().setdecimal(self._ip + index)
+		host._mac = MacAddress.fromint(self._mac + index)
+		host._tags = frozenset(tag.strip() for tag in self._tags.split(",") if (tag.strip() != ""))
+		host._group = self._group
+		host._linenumber = self._linenumber
+		host._dns = None
+		host._network = self._network
+		return host
+
+	def __iter__(self):
+		"""Yields Host views of all hosts, ordered by IP address."""
+		for index in range(self._count):
+			yield self.gethost(index)
+
+	@classmethod
+	def splitname(cls, name):
+		"""Splits a host name into the tuple (prefix, number), number being
+		None if the name does not end in digits. The prefix never ends in a
+		digit, so it is the prefix of the only ranges that can contain the
+		name."""
+		match = cls._name_re.fullmatch(name)
+		if match is None:
+			return (name, None)
+		return (match.group(1), int(match.group(2)))
+
+	def containsname(self, name):
+		"""Returns True if one of the hosts of the range has the given name."""
+		(prefix, number) = self.splitname(name)
+		if (number is None) or (prefix != self._prefix):
+			return False
+		return (self._first <= number < self._first + self._count) and (self.getname(number - self._first) == name)
+
+	def namescollide(self, other):
+		"""Returns True if both ranges have a host name in common."""
+		if self._prefix != other._prefix:
+			return False
+		(lo, hi) = (max(self._first, other._first), min(self._first + self._count, other._first + other._count) - 1)
+		if lo > hi:
+			return False
+		if self._digits == other._digits:
+			return True
+		# Names only agree for numbers that are at least as wide as both
+		# paddings
+		return max(lo, 10 ** (max(self._digits, other._digits) - 1)) <= hi
+
+	def getfingerprint(self):
+		return (self._prefix, self._digits, self._first, self._count, self._ip, self._mac, self._tags, self._group)
+
+	def __str__(self):
+		(first, last) = self.getiprange()
+		return "%s-%s <%s-%s>" % (self.getname(0), self.getname(self._count - 1), IPv4Addr().setdecimal(first), IPv4Addr().setdecimal(last))
+
+class HostSet():
+	"""All hosts of a configuration: the individually declared ones and the
+	hosts of all host ranges, which are created as views while iterating."""
+
+	def __init__(self, hosts, hostranges):
+		self._hosts = hosts
+		self._hostranges = hostranges
+
+	def __iter__(self):
+		return itertools.chain(self._hosts, *self._hostranges)
+
+	def __len__(self):
+		return len(self._hosts) + sum(len(hostrange) for hostrange in self._hostranges)
+
+	def __contains__(self, host):
+		if host in self._hosts:
+			return True
+		return any(hostrange.containsname(host.getname()) and (hostrange.getiprange()[0] <= host.getip().get() <= hostrange.getiprange()[1]) for hostrange in self._hostranges)
+
 class Network(Comparable):
 	def __init__(self, xmlroot, xmlnode):
-		self._net = IPv4Network(xmlnode["subnet"])
-		self._name = xmlnode["name"]
+		dhcp = DHCPInfo(xmlroot, xmlnode.dhcp) if (xmlnode.getchild("dhcp") is not None) else None
+		dns = DNSServerInfo(xmlroot, xmlnode.dns) if (xmlnode.getchild("dns") is not None) else None
+		self._setup(xmlnode["subnet"], xmlnode["name"], dhcp, dns, xmlnode.getlinenumber())
+
+	@classmethod
+	def fromvalues(cls, subnet, name, dhcp = None, dns = None, linenumber = None):
+		"""Creates a network from plain (string) values instead of an XML
+		node; dhcp is a DHCPInfo and dns a DNSServerInfo or None."""
+		network = cls.__new__(cls)
+		network._setup(subnet, name, dhcp, dns, linenumber)
+		return network
+
+	def _setup(self, subnet, name, dhcp, dns, linenumber):
+		self._net = IPv4Network(subnet)
+		self._name = name
 		self._hostsbyip = { }
-		if xmlnode.getchild("dhcp") is not None:
-			self._dhcp = DHCPInfo(xmlroot, xmlnode.dhcp)
-		else:
-			self._dhcp = None
-		if xmlnode.getchild("dns") is not None:
-			self._dns = DNSServerInfo(xmlroot, xmlnode.dns)
-		else:
-			self._dns = None
+		self._hostranges = [ ]
+		self._dhcp = dhcp
+		self._dns = dns
+		self._linenumber = linenumber
 
 	def cmpkey(self):
 		return self._net
@@ -210,9 +459,23 @@ class Network(Comparable):
 	def addhost(self, host):
 		self._hostsbyip[host.getip()] = host
 
+	def addhostrange(self, hostrange):
+		self._hostranges.append(hostrange)
+
+	def gethostranges(self):
+		return self._hostranges
+
+	def getexplicithosts(self):
+		"""Returns an iterator over the hosts that were declared individually,
+		i.e. not by a host range."""
+		return iter(self._hostsbyip.values())
+
 	def getname(self):
 		return self._name
 
+	def getlinenumber(self):
+		return self._linenumber
+
 	def getnet(self):
 		return self._net
 
@@ -231,13 +494,50 @@ class Network(Comparable):
 	def getdns(self):
 		return self._dns
 
+	def getreservedips(self):
+		"""Returns the set of addresses (as integers) within the network that
+		are used by its routers and servers, i.e. the broadcast address,
+		router, DNS, NTP and PXE servers of DHCP and the DNS authority. These
+		are no hosts, but not free either."""
+		servers = [ ]
+		if self._dhcp is not None:
+			servers += [ self._dhcp.getbroadcast(), self._dhcp.getrouter(), self._dhcp.getpxenext() ]
+			servers += list(self._dhcp.getdnsservers()) + list(self._dhcp.getntpservers())
+		if self._dns is not None:
+			servers.append(self._dns.getauthority())
+		return set(ip.get() for ip in servers if (ip is not None) and self._net.contains(ip))
+
 	def __iter__(self):
-		return iter(self._hostsbyip.values())
+		return itertools.chain(self._hostsbyip.values(), *self._hostranges)
+
+	def gethostcount(self):
+		return len(self._hostsbyip) + sum(len(hostrange) for hostrange in self._hostranges)
+
+	def getfingerprint(self):
+		"""Returns a value that compares equal for networks with identical
+		attributes, DHCP and DNS settings (the hosts are not part of it)."""
+		return (
+			self._name, self._net.getnet().get(), self._net.getmask().get(),
+			self._dhcp.getfingerprint() if (self._dhcp is not None) else None,
+			self._dns.getfingerprint() if (self._dns is not None) else None,
+		)
+
+	def itersortedhosts(self):
+		"""Yields all hosts ordered like sorting by cmpkey would. Hosts of
+		ranges are merged in lazily."""
+		# Same order as sorting by cmpkey, but without Comparable overhead
+		sortkey = lambda host: (host.getip().get(), host.getname())
+		return heapq.merge(sorted(self._hostsbyip.values(), key = sortkey), *self._hostranges, key = sortkey)
 
 	def getsortedhosts(self):
-		return sorted(list(self._hostsbyip.values()))
+		return list(self.itersortedhosts())
+
+	def hasip(self, ip):
+		if ip in self._hostsbyip:
+			return True
+		return any(first <= ip.get() <= last for (first, last) in (hostrange.getiprange() for hostrange in self._hostranges))
 
 	def getnextavailableip(self):
 		for ip in self._net:
-			if ip not in self._hostsbyip:
+			if not self.hasip(ip):
 				return ip
@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import sys
+import random
+import argparse
+
+class SyntheticConfig():
+	"""Writes a synthetic, but valid networkconfig XML file of arbitrary size.
+	Hosts are distributed evenly over /24 networks (or /16 networks if more
+	hosts per network are requested than fit into a /24), every network has
+	DHCP and DNS information and hosts carry a deterministic mix of HINFO,
+	TXT and CNAME records. The XML is written as it is generated, so even
+	configurations with millions of hosts need no memory."""
+
+	_HINFO = [ ("x86_64", "Ubuntu"), ("x86_64", "Debian"), ("armv7", "Raspbian"), ("aarch64", "Linux") ]
+
+	def __init__(self, hostcount, networkcount = None, seed = 0):
+		assert(hostcount >= 1)
+		if networkcount is None:
+			networkcount = max(1, hostcount // 150)
+		self._hostcount = hostcount
+		self._networkcount = networkcount
+		self._seed = seed
+		self._hostspernet = (hostcount + networkcount - 1) // networkcount
+		if self._hostspernet <= 190:
+			self._cidr = 24
+			maxnetworks = 65536
+		elif self._hostspernet <= 65000:
+			self._cidr = 16
+			maxnetworks = 256
+		else:
+			raise Exception("%d hosts per network do not fit into a /16 network." % (self._hostspernet))
+		if networkcount > maxnetworks:
+			raise Exception("Cannot place %d /%d networks into 10.0.0.0/8." % (networkcount, self._cidr))
+
+	def gethostcount(self):
+		return self._hostcount
+
+	def getnetworkcount(self):
+		return self._networkcount
+
+	def _netbase(self, netno):
+		if self._cidr == 24:
+			return (10 << 24) | (netno << 8)
+		else:
+			return (10 << 24) | (netno << 16)
+
+	@staticmethod
+	def _ipstr(value):
+		return "%d.%d.%d.%d" % ((value >> 24) & 0xff, (value >> 16) & 0xff, (value >> 8) & 0xff, (value >> 0) & 0xff)
+
+	def _netname(self, netno):
+		return "net%d.example" % (netno)
+
+	def _writenetwork(self, f, netno):
+		base = self._netbase(netno)
+		size = 1 << (32 - self._cidr)
+		if self._cidr == 24:
+			(rangefrom, rangeto) = (base + 200, base + size - 2)
+		else:
+			(rangefrom, rangeto) = (base + size - 256, base + size - 2)
+		gateway = self._ipstr(base + 1)
+		f.write("\t\t<network subnet=\"%s/%d\" name=\"%s\">\n" % (self._ipstr(base), self._cidr, self._netname(netno)))
+		f.write("\t\t\t<dhcp>\n")
+		f.write("\t\t\t\t<range from=\"%s\" to=\"%s\" />\n" % (self._ipstr(rangefrom), self._ipstr(rangeto)))
+		f.write("\t\t\t\t<broadcast ip=\"%s\" />\n" % (self._ipstr(base + size - 1)))
+		f.write("\t\t\t\t<dnsserver ip=\"%s\" />\n" % (gateway))
+		f.write("\t\t\t\t<router ip=\"%s\" />\n" % (gateway))
+		f.write("\t\t\t\t<ntpserver ip=\"%s\" />\n" % (gateway))
+		f.write("\t\t\t\t<leasetime default=\"7200\" max=\"14400\" />\n")
+		if netno % 4 == 0:
+			f.write("\t\t\t\t<pxe filename=\"pxelinux.0\" next=\"%s\" />\n" % (gateway))
+		f.write("\t\t\t</dhcp>\n")
+		f.write("\t\t\t<dns>\n")
+		f.write("\t\t\t\t<authority ip=\"%s\" />\n" % (gateway))
+		f.write("\t\t\t</dns>\n")
+		f.write("\t\t</network>\n")
+
+	def _writehost(self, f, rnd, hostno):
+		netno = hostno % self._networkcount
+		ip = self._netbase(netno) + 10 + (hostno // self._networkcount)
+		mac = (0x02 << 40) | hostno
+		macstr = ":".join("%02x" % ((mac >> shift) & 0xff) for shift in range(40, -8, -8))
+		f.write("\t\t<host ip=\"%s\" mac=\"%s\" name=\"host%d\"" % (self._ipstr(ip), macstr, hostno))
+
+		records = [ ]
+		if rnd.random() < 0.5:
+			(arch, osname) = rnd.choice(self._HINFO)
+			records.append("<hinfo arch=\"%s\" os=\"%s\" />" % (arch, osname))
+		for i in range(rnd.choice([ 0, 0, 1, 2 ])):
+			records.append("<text value=\"Asset tag %d-%d\" />" % (hostno, i))
+		if rnd.random() < 0.1:
+			records.append("<cname name=\"alias%d\" />" % (hostno))
+
+		if len(records) == 0:
+			f.write(" />\n")
+		else:
+			f.write(">\n\t\t\t<dns>\n")
+			for record in records:
+				f.write("\t\t\t\t%s\n" % (record))
+			f.write("\t\t\t</dns>\n\t\t</host>\n")
+
+	def write(self, f):
+		"""Writes the complete XML document to the text file object f."""
+		rnd = random.Random(self._seed)
+		f.write("<?xml version=\"1.0\" encoding=\"utf-8\"?>\n")
+		f.write("<config name=\"synthetic\">\n")
+		f.write("\t<networks>\n")
+		for netno in range(self._networkcount):
+			self._writenetwork(f, netno)
+		f.write("\t</networks>\n")
+		f.write("\t<hosts>\n")
+		for hostno in range(self._hostcount):
+			self._writehost(f, rnd, hostno)
+		f.write("\t</hosts>\n")
+		f.write("</config>\n")
+
+	def writefile(self, filename):
+		with open(filename, "w", buffering = 1024 * 1024) as f:
+			self.write(f)
+
+def parsecount(text):
+	"""Parses counts like "10000", "10k" or "1M"."""
+	multiplier = { "k": 1000, "m": 1000000 }.get(text[-1:].lower(), 1)
+	if multiplier != 1:
+		text = text[:-1]
+	return int(text) * multiplier
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = sys.argv[0], description = "Synthetic networkconfig XML generator for benchmarking", add_help = True)
+	parser.add_argument("outfile", metavar = "filename", type = str, help = "Output XML filename")
+	parser.add_argument("-hosts", metavar = "count", type = parsecount, help = "Number of hosts, e.g. 10k or 1M (default is %(default)s)", default = 10000)
+	parser.add_argument("-networks", metavar = "count", type = parsecount, help = "Number of networks (default is one per 150 hosts)")
+	parser.add_argument("-seed", metavar = "int", type = int, help = "Random seed for the record mix (default is %(default)s)", default = 0)
+	args = parser.parse_args(sys.argv[1:])
+
+	SyntheticConfig(args.hosts, args.networks, args.seed).writefile(args.outfile)
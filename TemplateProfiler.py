@@ -0,0 +1,133 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import sys
+import json
+import time
+import contextlib
+
+class TemplateProfiler():
+	"""Traces the rendering of templates and accounts the time spent to the
+	lines of the template source, using the line mapping Mako keeps for
+	its compiled templates. Each template line is charged with the time from
+	the start of its execution until the next line of the same template
+	starts, so times are inclusive of everything called from the line (e.g.
+	getters of the model or FastEmitter). Lines within <%def>s that are
+	called from another line are accounted to both. Tracing slows down
+	rendering considerably; a disabled profiler does not trace at all."""
+
+	def __init__(self, enabled = True, topcount = 20):
+		self._enabled = enabled
+		self._topcount = topcount
+		# (generatorname, templatefilename, templateline) -> [ time, hits ]
+		self._lines = { }
+		self._sources = { }
+
+	def isenabled(self):
+		return self._enabled
+
+	@contextlib.contextmanager
+	def trace(self, generatorname, template):
+		"""Context manager that traces the given _Template while it is being
+		rendered within it and accounts its lines to the given generator."""
+		if not self._enabled:
+			yield
+			return
+
+		codefilename = template.getcodefilename()
+		linemap = template.getlinemap()
+		filename = template.getfilename()
+		self._sources[filename] = template.getsourcelines()
+		pytimes = { }
+		frames = { }
+
+		def localtrace(frame, event, arg):
+			now = time.perf_counter()
+			previous = frames.get(frame)
+			if previous is not None:
+				(pyline, start) = previous
+				entry = pytimes.get(pyline)
+				if entry is None:
+					pytimes[pyline] = [ now - start, 1 ]
+				else:
+					entry[0] += now - start
+					entry[1] += 1
+			if event == "return":
+				frames.pop(frame, None)
+			else:
+				frames[frame] = (frame.f_lineno, time.perf_counter())
+			return localtrace
+
+		def globaltrace(frame, event, arg):
+			if frame.f_code.co_filename == codefilename:
+				return localtrace
+			return None
+
+		previoustrace = sys.gettrace()
+		sys.settrace(globaltrace)
+		try:
+			yield
+		finally:
+			sys.settrace(previoustrace)
+			templatelines = { }
+			for (pyline, (duration, hits)) in pytimes.items():
+				templateline = linemap[pyline - 1] if (pyline - 1 < len(linemap)) else 0
+				if templateline == 0:
+					# Module preamble of the compiled template
+					continue
+				entry = templatelines.get(templateline)
+				if entry is None:
+					templatelines[templateline] = [ duration, hits ]
+				else:
+					# Several Python lines may map to the same template line,
+					# count executions of the template line only once
+					entry[0] += duration
+					entry[1] = max(entry[1], hits)
+			for (templateline, (duration, hits)) in templatelines.items():
+				key = (generatorname, filename, templateline)
+				entry = self._lines.get(key)
+				if entry is None:
+					self._lines[key] = [ duration, hits ]
+				else:
+					entry[0] += duration
+					entry[1] += hits
+
+	def getreport(self):
+		"""Returns the hottest template lines per generator as a
+		JSON-serializable dictionary."""
+		generators = { }
+		for ((generatorname, filename, templateline), (duration, hits)) in self._lines.items():
+			sourcelines = self._sources[filename]
+			generators.setdefault(generatorname, [ ]).append({
+				"template":	filename,
+				"line":		templateline,
+				"source":	sourcelines[templateline - 1].strip() if (templateline <= len(sourcelines)) else None,
+				"time":		duration,
+				"hits":		hits,
+			})
+		for (generatorname, lines) in generators.items():
+			lines.sort(key = lambda line: (-line["time"], line["template"], line["line"]))
+			generators[generatorname] = lines[:self._topcount]
+		return generators
+
+	def writereport(self, f):
+		json.dump(self.getreport(), f, indent = 4, sort_keys = True)
+		f.write("\n")
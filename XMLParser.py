@@ -117,6 +117,12 @@ class XMLNode():
 		self._children.append(node)
 		return node
 	
+	def replacechildren(self, children):
+		"""Replaces the child list of the current node by the given list of
+		XMLNodes, e.g. to remove or insert many children at once."""
+		assert(all(isinstance(child, XMLNode) for child in children))
+		self._children = list(children)
+
 	def getallchildren(self):
 		"""Return an iterator over all children."""
 		return iter(self._children)
@@ -376,6 +382,12 @@ class XMLNode():
 		f.write("<?xml version=\"1.0\" encoding=\"utf-8\" ?>\n")
 		self._dumpnode(f, pretty, sortkey = sortkey)
 
+	def writenode(self, f, pretty = False, indent = 0, sortkey = None):
+		"""Writes this node and its subtree (without XML declaration) to the
+		given file object, e.g. to insert it into an existing document. With
+		pretty-printing, the node is indented by the given number of tabs."""
+		self._dumpnode(f, pretty, indent, sortkey)
+
 	def getxmlstr(self, pretty = False):
 		"""Returns the XML string as it would be written to a file by the
 		'write' function."""
@@ -435,7 +447,7 @@ class XMLParser():
 	
 	def parse(self, xmltext):
 		"""Parse the given XML text and return the root node."""
-		self._parser.Parse(xmltext)
+		self._parser.Parse(xmltext, True)
 		return self._rootnode
 
 	def getrootnode(self):
@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+import os
+import sys
+import time
+import argparse
+from BatchGenerator import BatchGenerator
+
+parser = argparse.ArgumentParser(prog = sys.argv[0], description = "Generate the configurations of many sites at once. Generators and templates are loaded only once and the sites are distributed across worker processes. Exits with status 1 if any site failed.", add_help = True)
+parser.add_argument("infiles", metavar = "filename", type = str, nargs = "*", help = "Input XML filenames, one per site")
+parser.add_argument("-sitelist", metavar = "filename", type = str, help = "File that lists further sites, one per line as input filename optionally followed by its output directory; empty lines and lines starting with '#' are ignored")
+parser.add_argument("-outdir", metavar = "pattern", type = str, help = "Output directory of sites that do not have one in the site list; {site} is replaced by the input filename without directory and extension (default is %(default)s)", default = "outdir/{site}/")
+parser.add_argument("-gendir", metavar = "path", type = str, help = "Input directory where generator file are located (default is %(default)s", default = "generators/")
+parser.add_argument("-only", metavar = "generators", type = str, help = "Comma-separated list of generators to run, e.g. bind9,dhcp (default is all generators in gendir)")
+parser.add_argument("-jobs", metavar = "count", type = int, help = "Number of worker processes that generate sites in parallel (default is the number of CPUs, %(default)s)", default = os.cpu_count() or 1)
+parser.add_argument("-durable", action = "store_true", help = "Make the outputs crash-safe, see generate_networkconfig.py")
+args = parser.parse_args(sys.argv[1:])
+
+def defaultoutdir(infile):
+	return args.outdir.replace("{site}", os.path.splitext(os.path.basename(infile))[0])
+
+sites = [ (infile, defaultoutdir(infile)) for infile in args.infiles ]
+if args.sitelist is not None:
+	with open(args.sitelist) as f:
+		for line in f:
+			line = line.strip()
+			if (line == "") or line.startswith("#"):
+				continue
+			fields = line.split(None, 1)
+			sites.append((fields[0], fields[1] if (len(fields) > 1) else defaultoutdir(fields[0])))
+if len(sites) == 0:
+	parser.error("no sites given")
+
+outdirs = { }
+for (infile, outdir) in sites:
+	if os.path.normpath(outdir) in outdirs:
+		parser.error("sites %s and %s would both be written to %s" % (outdirs[os.path.normpath(outdir)], infile, outdir))
+	outdirs[os.path.normpath(outdir)] = infile
+
+t0 = time.perf_counter()
+try:
+	batch = BatchGenerator(args.gendir, args.only.split(",") if (args.only is not None) else None, args.jobs, args.durable)
+except Exception as e:
+	print("%s: %s" % (sys.argv[0], str(e)), file = sys.stderr)
+	sys.exit(2)
+
+failed = 0
+for (infile, outdir, error, outputs, elapsed) in batch.run(sites):
+	if error is None:
+		print("%s: %d outputs written to %s in %.0f ms" % (infile, outputs, outdir, elapsed * 1000), file = sys.stderr)
+	else:
+		print("%s: FAILED: %s" % (infile, error), file = sys.stderr)
+		failed += 1
+print("%d sites generated, %d failed, in %.1f s" % (len(sites) - failed, failed, time.perf_counter() - t0), file = sys.stderr)
+sys.exit(1 if (failed > 0) else 0)
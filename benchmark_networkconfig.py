@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from SyntheticConfig import SyntheticConfig, parsecount
+
+parser = argparse.ArgumentParser(prog = sys.argv[0], description = "Benchmark the networkconfig pipeline on synthetic configurations", add_help = True)
+parser.add_argument("-scales", metavar = "counts", type = str, help = "Comma-separated list of host counts to benchmark, e.g. 10k,100k,1M (default is %(default)s)", default = "10k,100k")
+parser.add_argument("-networks", metavar = "count", type = parsecount, help = "Number of networks per configuration (default is one per 150 hosts)")
+parser.add_argument("-repeat", metavar = "count", type = int, help = "Run every scale this many times and report the fastest run (default is %(default)s)", default = 1)
+parser.add_argument("-gendir", metavar = "path", type = str, help = "Generator directory passed to generate_networkconfig.py (default is %(default)s)", default = "generators/")
+parser.add_argument("-keep", metavar = "path", type = str, help = "Keep synthetic configurations and generated output in this directory instead of a temporary one")
+parser.add_argument("-json", metavar = "filename", type = str, help = "Additionally write all results as JSON to this file")
+args = parser.parse_args(sys.argv[1:])
+
+basedir = os.path.dirname(os.path.abspath(__file__))
+
+def runpipeline(cfgfile, outdir, profilefile):
+	"""Runs generate_networkconfig.py end-to-end in a child process and
+	returns its wall time, peak RSS in bytes and --profile report."""
+	cmd = [ sys.executable, os.path.join(basedir, "generate_networkconfig.py"), cfgfile, "-gendir", args.gendir, "-outdir", outdir + "/", "--profile", profilefile ]
+	t0 = time.perf_counter()
+	proc = subprocess.Popen(cmd, stderr = subprocess.DEVNULL)
+	(pid, status, rusage) = os.wait4(proc.pid, 0)
+	wall = time.perf_counter() - t0
+	proc.returncode = os.waitstatus_to_exitcode(status)
+	if proc.returncode != 0:
+		raise Exception("%s failed with exit code %d" % (" ".join(cmd), proc.returncode))
+	with open(profilefile) as f:
+		profile = json.load(f)
+	return {
+		"wall":		wall,
+		"maxrss":	rusage.ru_maxrss * 1024,
+		"profile":	profile,
+	}
+
+def stages(profile):
+	"""Condenses the phases of a --profile report into benchmark stages. Every
+	stage is a (name, wall, cpu) tuple."""
+	phases = profile["phases"]
+	def summed(predicate):
+		selected = [ value for (name, value) in phases.items() if predicate(name) ]
+		return (sum(value["wall"] for value in selected), sum(value["cpu"] for value in selected))
+
+	result = [ ]
+	result.append(("parse", ) + summed(lambda name: name == "parse"))
+	result.append(("model", ) + summed(lambda name: name.startswith("model/")))
+	result.append(("validation", ) + summed(lambda name: name.startswith("validate/")))
+	generators = sorted(name.split("/")[1] for name in phases if name.startswith("import/"))
+	for generator in generators:
+		result.append(("gen " + generator, ) + summed(lambda name: name in [ "import/" + generator, "generate/" + generator ]))
+	return result
+
+def benchmark(workdir, hostcount):
+	synth = SyntheticConfig(hostcount, args.networks)
+	cfgfile = os.path.join(workdir, "synthetic_%d.xml" % (hostcount))
+	print("Writing synthetic configuration with %d hosts in %d networks to %s" % (synth.gethostcount(), synth.getnetworkcount(), cfgfile), file = sys.stderr)
+	synth.writefile(cfgfile)
+
+	best = None
+	for i in range(args.repeat):
+		outdir = os.path.join(workdir, "out_%d" % (hostcount))
+		shutil.rmtree(outdir, ignore_errors = True)
+		run = runpipeline(cfgfile, outdir, os.path.join(workdir, "profile_%d.json" % (hostcount)))
+		if (best is None) or (run["wall"] < best["wall"]):
+			best = run
+
+	return {
+		"hosts":		synth.gethostcount(),
+		"networks":		synth.getnetworkcount(),
+		"inputbytes":	os.path.getsize(cfgfile),
+		"wall":			best["wall"],
+		"maxrss":		best["maxrss"],
+		"outputbytes":	best["profile"]["counts"].get("outputbytes", 0),
+		"outputs":		best["profile"]["counts"].get("outputs", 0),
+		"stages":		[ { "name": name, "wall": wall, "cpu": cpu } for (name, wall, cpu) in stages(best["profile"]) ],
+	}
+
+def printresult(result):
+	print("%d hosts, %d networks: %.2f s end-to-end (%.0f hosts/s), peak RSS %.1f MiB, %d outputs with %.1f MiB" % (result["hosts"], result["networks"], result["wall"], result["hosts"] / result["wall"], result["maxrss"] / 1024 / 1024, result["outputs"], result["outputbytes"] / 1024 / 1024))
+	for stage in result["stages"]:
+		throughput = result["hosts"] / stage["wall"] if (stage["wall"] > 0) else float("inf")
+		print("    %-16s %9.3f s wall %9.3f s CPU %12.0f hosts/s" % (stage["name"], stage["wall"], stage["cpu"], throughput))
+	print()
+
+if args.keep is None:
+	workdir = tempfile.mkdtemp(prefix = "networkconfig_bench_")
+else:
+	workdir = args.keep
+	os.makedirs(workdir, exist_ok = True)
+
+try:
+	results = [ ]
+	for hostcount in [ parsecount(scale) for scale in args.scales.split(",") ]:
+		result = benchmark(workdir, hostcount)
+		printresult(result)
+		results.append(result)
+finally:
+	if args.keep is None:
+		shutil.rmtree(workdir)
+
+if args.json is not None:
+	with open(args.json, "w") as f:
+		json.dump(results, f, indent = 4)
@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+import sys
+import argparse
+from ConfigDiff import ConfigDiff
+
+parser = argparse.ArgumentParser(prog = sys.argv[0], description = "Show the semantic differences between two networkconfig XML files and the generated outputs they affect. Exits with status 1 if the configurations differ.", add_help = True)
+parser.add_argument("oldfile", metavar = "old", type = str, help = "Old input XML filename")
+parser.add_argument("newfile", metavar = "new", type = str, help = "New input XML filename")
+parser.add_argument("-gendir", metavar = "path", type = str, help = "Input directory where generator file are located (default is %(default)s", default = "generators/")
+parser.add_argument("-only", metavar = "generators", type = str, help = "Comma-separated list of generators whose outputs are considered (default is all generators in gendir)")
+parser.add_argument("-nooutputs", action = "store_true", help = "Do not determine the affected outputs")
+args = parser.parse_args(sys.argv[1:])
+
+try:
+	diff = ConfigDiff.fromfiles(args.oldfile, args.newfile)
+except Exception as e:
+	print("%s: %s" % (sys.argv[0], str(e)), file = sys.stderr)
+	sys.exit(2)
+
+symbols = { "added": "+", "removed": "-", "modified": "~", "unknown": "?" }
+for (kind, action, name, details) in diff.getchanges():
+	print("%s %s %s" % (symbols[action], kind, name))
+	for (field, old, new) in details:
+		print("\t%s: %s -> %s" % (field, old or "(none)", new or "(none)"))
+
+if (not args.nooutputs) and (not diff.isempty()):
+	from ConfigGenerator import ConfigGenerator
+	configgenerator = ConfigGenerator(args.gendir)
+	generators = configgenerator.getregistry().select(args.only.split(",") if (args.only is not None) else None)
+	print()
+	print("Affected outputs (? = depends on the whole configuration):")
+	for (action, destfilename) in diff.getoutputchanges(configgenerator, generators):
+		print("%s %s" % (symbols[action], destfilename))
+
+sys.exit(0 if diff.isempty() else 1)
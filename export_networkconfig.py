@@ -0,0 +1,22 @@
+#!/usr/bin/python3
+import sys
+import argparse
+from ConfigModel import ConfigModel
+from InventoryExport import InventoryExport
+
+parser = argparse.ArgumentParser(prog = sys.argv[0], description = "Export the hosts and networks of a networkconfig XML file as memory-mappable binary columns (see InventoryExport.py for the format)", add_help = True)
+parser.add_argument("infile", metavar = "filename", type = str, help = "Input XML filename")
+parser.add_argument("outfile", metavar = "filename", type = str, help = "Output filename; '-' writes to stdout")
+args = parser.parse_args(sys.argv[1:])
+
+try:
+	model = ConfigModel.fromfile(args.infile)
+except Exception as e:
+	print("%s: %s" % (args.infile, str(e)), file = sys.stderr)
+	sys.exit(1)
+
+export = InventoryExport(model)
+if args.outfile == "-":
+	export.write(sys.stdout.buffer)
+else:
+	export.writefile(args.outfile)
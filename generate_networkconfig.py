@@ -1,88 +1,147 @@
 #!/usr/bin/python3
 import os
 import sys
+import time
 import argparse
-from XMLParser import XMLParser
-from Representation import Host, Network
-from Controller import Controller
+from ConfigModel import ConfigModel
+from Profiler import Profiler
+from ConfigGenerator import ConfigGenerator
+from MemoryProfiler import MemoryProfiler, MemoryBudgetExceeded
+from TemplateProfiler import TemplateProfiler
+
+# Controller (and with it mako), the output backends and the file watcher are
+# imported only when they are needed, so that --check starts up quickly.
 
 parser = argparse.ArgumentParser(prog = sys.argv[0], description = "Server configuration file generator", add_help = True)
 parser.add_argument("infile", metavar = "filename", type = str, help = "Input XML filename")
 #parser.add_argument("-args", metavar = "dict", type = str, help = "Passes a Python dictionary which is available as reference from within scripts")
 parser.add_argument("-gendir", metavar = "path", type = str, help = "Input directory where generator file are located (default is %(default)s", default = "generators/")
 parser.add_argument("-outdir", metavar = "path", type = str, help = "Output directory to put files in (default is %(default)s", default = "outdir/")
+parser.add_argument("-only", metavar = "generators", type = str, help = "Comma-separated list of generators to run, e.g. bind9,dhcp (default is all generators in gendir)")
+parser.add_argument("-network", metavar = "names", type = str, help = "Comma-separated list of network names; generators that create per-network outputs only create them for these networks")
+parser.add_argument("-bundle", metavar = "filename", type = str, help = "Instead of writing to outdir, put all outputs (with their permissions and owners) into this tar archive; '-' writes the archive to stdout")
+parser.add_argument("-durable", action = "store_true", help = "Make the outputs in outdir crash-safe: files are fsynced by background writer threads and renamed into place together at the end of the run")
+parser.add_argument("-compress", choices = [ "gz", "bz2", "xz" ], help = "Compress the -bundle archive")
+parser.add_argument("-jobs", metavar = "count", type = int, help = "Number of worker processes generators may use to render outputs in parallel (default is the number of CPUs, %(default)s)", default = os.cpu_count() or 1)
+parser.add_argument("-watch", action = "store_true", help = "Keep running, watch the input file for changes and regenerate the outputs affected by a change")
+parser.add_argument("-interval", metavar = "secs", type = float, help = "Polling interval of -watch in seconds (default is %(default)s)", default = 0.5)
+parser.add_argument("--check", action = "store_true", help = "Only load and validate the configuration and exit with a non-zero status if it is invalid; nothing is generated")
+parser.add_argument("--profile", metavar = "filename", type = str, nargs = "?", const = "-", help = "Write a JSON report of per-phase wall/CPU times and counts to the given file (or stdout if omitted)")
+parser.add_argument("--memprofile", metavar = "filename", type = str, nargs = "?", const = "-", help = "Trace allocations with tracemalloc and write a JSON report with the top allocation sites and peak RSS after parsing, model construction and every generator to the given file (or stdout if omitted)")
+parser.add_argument("--templateprofile", metavar = "filename", type = str, nargs = "?", const = "-", help = "Trace template rendering and write a JSON report of the hottest template source lines of every generator to the given file (or stdout if omitted); outputs are then rendered sequentially")
+parser.add_argument("--membudget", metavar = "MiB", type = float, help = "Fail the run as soon as the peak RSS exceeds this many MiB")
 args = parser.parse_args(sys.argv[1:])
+if (args.bundle is not None) and args.watch:
+	parser.error("-bundle cannot be combined with -watch")
+if (args.bundle is not None) and args.durable:
+	parser.error("-durable only applies to outdir and cannot be combined with -bundle")
+if [ args.bundle, args.profile, args.memprofile, args.templateprofile ].count("-") > 1:
+	parser.error("only one of -bundle, --profile, --memprofile and --templateprofile can write to stdout")
+
+profiler = Profiler(enabled = args.profile is not None)
+if (args.memprofile is not None) or (args.membudget is not None):
+	memprofiler = MemoryProfiler(trace = args.memprofile is not None, budget = int(args.membudget * 1024 * 1024) if (args.membudget is not None) else None).attach(profiler)
+else:
+	memprofiler = None
+templateprofiler = TemplateProfiler(enabled = args.templateprofile is not None)
+
+def selectnetworks(model):
+	"""Returns the networks for which per-network outputs are created, i.e.
+	the ones given by -network or all of them."""
+	if args.network is None:
+		return model.getnetworks()
+	return set(model.getnetwork(name) for name in args.network.split(","))
+
+def writeprofile():
+	for (filename, reporter) in [ (args.profile, profiler), (args.memprofile, memprofiler), (args.templateprofile, templateprofiler) ]:
+		if filename == "-":
+			reporter.writereport(sys.stdout)
+		elif filename is not None:
+			with open(filename, "w") as f:
+				reporter.writereport(f)
+
+def log(msg):
+	print(msg, file = sys.stderr)
+
+def generate(model, selectednetworks):
+	configgenerator.generate(model, output, generatornames, selectednetworks, profiler, templateprofiler)
+
+def watch(model):
+	"""Polls the input file and regenerates outputs whenever it changes. Only
+	per-network outputs of networks that actually changed are recreated, but
+	whole-config outputs are always recreated. If the changed file cannot be
+	loaded, the error is shown and the previous model is kept."""
+	from FileWatcher import FileWatcher
+
+	watcher = FileWatcher(args.infile)
+	watcher.poll()
+	while True:
+		time.sleep(args.interval)
+		content = watcher.poll()
+		if content is None:
+			continue
+
+		t0 = time.perf_counter()
+		try:
+			newmodel = ConfigModel.frombytes(content)
+			selectednetworks = selectnetworks(newmodel)
+		except Exception as e:
+			print("%s: %s: %s -- keeping previous configuration" % (args.infile, e.__class__.__name__, str(e)), file = sys.stderr)
+			continue
+
+		(changed, removed) = model.changednetworks(newmodel)
+		model = newmodel
+		if (len(changed) == 0) and (len(removed) == 0):
+			continue
+		for name in sorted(removed):
+			print("%s: network %s was removed, its outputs are left in place" % (args.infile, name), file = sys.stderr)
+
+		try:
+			generate(model, changed & selectednetworks)
+		except Exception as e:
+			print("%s: regeneration failed: %s: %s" % (args.infile, e.__class__.__name__, str(e)), file = sys.stderr)
+			continue
+		print("%s: regenerated after change of %d network(s) in %.0f ms" % (args.infile, len(changed), (time.perf_counter() - t0) * 1000), file = sys.stderr)
+
+if args.check:
+	try:
+		model = ConfigModel.fromfile(args.infile, profiler)
+		selectnetworks(model)
+	except Exception as e:
+		writeprofile()
+		print("%s: %s" % (args.infile, str(e)), file = sys.stderr)
+		sys.exit(1)
+	writeprofile()
+	sys.exit(0)
+
+configgenerator = ConfigGenerator(args.gendir, log = log, jobs = args.jobs)
+generatornames = configgenerator.getregistry().select(args.only.split(",") if (args.only is not None) else None)
 
+from Output import DirectoryOutput, TarOutput
+if args.bundle is None:
+	output = DirectoryOutput(args.outdir, durable = args.durable)
+elif args.bundle == "-":
+	output = TarOutput(sys.stdout.buffer, args.compress)
+else:
+	output = TarOutput.tofile(args.bundle, args.compress)
 
-# Load data from XML
-xml = XMLParser().parsefile(args.infile)
-hosts = set()
-for host in xml.hosts.host:
-	hosts.add(Host(xml, host))
-
-networks = set()
-for network in xml.networks.network:
-	networks.add(Network(xml, network))
-
-# Resolve that every host is in exactly one network
-for host in hosts:
-	contained = False
-	for network in networks:
-		if network.contains(host):
-			contained = True
-			host.setnetwork(network)
-			network.addhost(host)
-	if not contained:
-		raise Exception("Host %s with IP %s is not contained within any declared network." % (host.getname(), host.getip()))
-
-# Ensure that network suffixes are unique
-netnames = set()
-for network in networks:
-	if network.getname() in netnames:
-		raise Exception("Duplicate network name: %s" % (network.getname()))
-	netnames.add(network.getname())
-
-# Ensure that names are unique within networks
-for network in networks:
-	names = set()
-	for host in network:
-		if host.getname() in names:
-			raise Exception("Duplicate hostname: %s.%s" % (host.getname(), network.getname()))
-		names.add(host.getname())
-
-# Ensure that MAC and IP addresses are unique within the whole config domain
-macs = { }
-ips = { }
-for host in hosts:
-	if host.getmac() in macs:
-		raise Exception("Duplicate MAC address: %s by %s collides with %s" % (host.getmac(), str(host), str(macs[host.getmac()])))
-	if host.getip() in ips:
-		raise Exception("Duplicate IP address: %s by %s collides with %s (next available is %s)" % (host.getip(), str(host), str(ips[host.getip()]), host.getnetwork().getnextavailableip()))
-	ips[host.getip()] = host
-	macs[host.getmac()] = host
-
-def getgenerator(basedir, modname):
-	oldpath = list(sys.path)
-	sys.path = [ basedir ]
-	module = __import__(modname)
-	sys.path = oldpath
-	return module.Generator
-
-
-# Prepare generator controller data
-data = {
-	"hosts":		hosts,
-	"networks":		networks,
-}
-
-# Load generators
-for generatorname in os.listdir(args.gendir):
-	genclass = getgenerator(args.gendir, generatorname)
-
-	# Prepare specific controller
-	ctrl = Controller(generatorname, data, args)
-	
-	# Instanciate generator and execute
-	generator = genclass(ctrl)
-	generator.generate()
+from Controller import TemplateException
+try:
+	model = ConfigModel.fromfile(args.infile, profiler)
+	generate(model, selectnetworks(model))
+except TemplateException as e:
+	print("Templating error, cannot continue. Mako-decoded stacktrace follows:", file = sys.stderr)
+	print(e.stacktrace, file = sys.stderr)
+	sys.exit(1)
+except MemoryBudgetExceeded as e:
+	writeprofile()
+	print(str(e), file = sys.stderr)
+	sys.exit(1)
+output.close()
+writeprofile()
 
+if args.watch:
+	try:
+		watch(model)
+	except KeyboardInterrupt:
+		pass
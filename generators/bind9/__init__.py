@@ -19,19 +19,208 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+import re
 import time
+from IPv4 import IPv4Addr, IPv4Network
+
+class GenerateRun():
+	"""A run of hosts whose A and PTR records BIND can create from a single
+	$GENERATE directive: consecutive IP addresses within one /24 and names
+	of the form <prefix><number> with consecutively increasing numbers. The
+	$GENERATE iterator runs over the last octet of the IP address."""
+	_name_re = re.compile(r"(.*?)(\d+)")
+
+	def __init__(self, host):
+		self._hosts = [ host ]
+		match = self._name_re.fullmatch(host.getname())
+		if match is None:
+			self._prefix = None
+			return
+		(self._prefix, digits) = match.groups()
+		self._width = len(digits) if ((len(digits) > 1) and digits.startswith("0")) else 0
+		self._firstnumber = int(digits)
+
+	def extend(self, host):
+		"""Appends the host to the run if it continues the arithmetic sequence
+		and returns whether it did."""
+		if self._prefix is None:
+			return False
+		last = self._hosts[-1]
+		ip = host.getip().get()
+		if (ip != last.getip().get() + 1) or ((ip >> 8) != (last.getip().get() >> 8)):
+			return False
+		if host.getname() != "%s%0*d" % (self._prefix, self._width, self._firstnumber + len(self._hosts)):
+			return False
+		self._hosts.append(host)
+		return True
+
+	def gethosts(self):
+		return self._hosts
+
+	def getrange(self):
+		return "%d-%d" % (self._hosts[0].getip().get() & 0xff, self._hosts[-1].getip().get() & 0xff)
+
+	def getnameexpr(self):
+		offset = self._firstnumber - (self._hosts[0].getip().get() & 0xff)
+		return "%s${%d,%d,d}" % (self._prefix, offset, self._width)
+
+	def getipexpr(self):
+		return str(self._hosts[0].getip()).rsplit(".", 1)[0] + ".$"
 
 class Generator():
+	# Runs shorter than this are written as explicit records
+	_MINRUN = 4
+
+	# The host records of forward zones with more hosts than this are split
+	# into one $INCLUDE file per /24 (None disables splitting)
+	_SHARD_THRESHOLD = 4096
+
+	# SOA serials are seconds since the epoch, shifted so that they are larger
+	# than the serials of the former YYYYMMDDHH format (up to 2026123123)
+	_SERIAL_OFFSET = 240000000
+
+	# Last serial handed out by this process
+	_lastserial = 0
+
 	def __init__(self, controller):
 		self._controller = controller
 
+	@classmethod
+	def _nextserial(cls):
+		"""Returns a SOA serial that is larger than every serial handed out
+		before, even if zones are regenerated several times within a second
+		(e.g. with -watch). Every rewritten zone thereby reaches the
+		secondaries."""
+		serial = max(int(time.time()) + cls._SERIAL_OFFSET, cls._lastserial + 1)
+		cls._lastserial = serial
+		return serial
+
+	def _hostblocks(self, hosts):
+		"""Splits the sorted hosts into a list of (run, hosts) tuples. For
+		runs that are long enough, run is a GenerateRun and their A and PTR
+		records are emitted as $GENERATE directives; otherwise run is None and
+		hosts is a single host that is written explicitly."""
+		blocks = [ ]
+		run = None
+		for host in hosts:
+			if (run is None) or (not run.extend(host)):
+				if run is not None:
+					blocks += self._runblocks(run)
+				run = GenerateRun(host)
+		if run is not None:
+			blocks += self._runblocks(run)
+		return blocks
+
+	def _runblocks(self, run):
+		if len(run.gethosts()) >= self._MINRUN:
+			return [ (run, run.gethosts()) ]
+		return [ (None, [ host ]) for host in run.gethosts() ]
+
+	def _revshards(self, network, sortedhosts):
+		"""Returns the reverse zones of the network as a list of (zone, hosts)
+		tuples. Networks larger than a /24 are split at /24 boundaries into
+		one zone per /24, including the ones without hosts (which then only
+		hold SOA and NS records): the set of zones is fixed by the network,
+		so every zone can be configured and removing the last host of a /24
+		empties its zone. A /24 or smaller network (the latter as RFC 2317
+		classless zone) is a single zone."""
+		net = network.getnet()
+		if net.getcidr() >= 24:
+			return [ (net.getrevrepr(), sortedhosts) ]
+		shards = { }
+		for host in sortedhosts:
+			shards.setdefault(host.getip().get() >> 8, [ ]).append(host)
+		firstblock = net.getnet().get() >> 8
+		lastblock = firstblock + (1 << (24 - net.getcidr())) - 1
+		return [ (IPv4Network("%s/24" % (IPv4Addr().setdecimal(block << 8))).getrevrepr(), shards.get(block, [ ])) for block in range(firstblock, lastblock + 1) ]
+
+	def _fwdshards(self, sortedhosts):
+		"""Splits the sorted hosts into a list of (block, hosts) tuples, one
+		per /24 that contains hosts, block being e.g. "10.1.5". Shard
+		boundaries only depend on the addresses, so adding or removing a host
+		only ever changes a single shard."""
+		shards = { }
+		for host in sortedhosts:
+			shards.setdefault(host.getip().get() >> 8, [ ]).append(host)
+		return [ (str(IPv4Addr().setdecimal(block << 8)).rsplit(".", 1)[0], hosts) for (block, hosts) in sorted(shards.items()) ]
+
+	def _forwardjobs(self, network, sortedhosts, serial):
+		"""Returns the jobs for the forward zone of the network. Large zones
+		consist of a main file with the SOA record (and therefore the serial)
+		that includes one file per shard; each shard has its own fingerprint,
+		so a host change rewrites its shard and the small main file only.
+		Shard files of /24s that no longer contain hosts are left in place
+		(but are not included anymore)."""
+		netprint = network.getfingerprint()
+		zonefile = "/etc/bind/db." + network.getname()
+		if (self._SHARD_THRESHOLD is None) or (len(sortedhosts) <= self._SHARD_THRESHOLD):
+			data = {
+				"network":		network,
+				"serial":		serial,
+				"shard":		None,
+				"includes":		[ ],
+				"hostblocks":	self._hostblocks(sortedhosts),
+			}
+			fingerprint = (netprint, tuple(host.getfingerprint() for host in sortedhosts))
+			return [ ("db.tmpl", zonefile, { "data": data, "fingerprint": fingerprint }) ]
+
+		jobs = [ ]
+		includes = [ ]
+		shardprints = [ ]
+		for (block, hosts) in self._fwdshards(sortedhosts):
+			shardfile = "%s.shard-%s" % (zonefile, block)
+			data = {
+				"network":		network,
+				"serial":		serial,
+				"shard":		block,
+				"includes":		[ ],
+				"hostblocks":	self._hostblocks(hosts),
+			}
+			fingerprint = (network.getname(), block, tuple(host.getfingerprint() for host in hosts))
+			jobs.append(("db.tmpl", shardfile, { "data": data, "fingerprint": fingerprint }))
+			includes.append(shardfile)
+			shardprints.append(fingerprint)
+
+		data = {
+			"network":		network,
+			"serial":		serial,
+			"shard":		None,
+			"includes":		includes,
+			"hostblocks":	[ ],
+		}
+		jobs.append(("db.tmpl", zonefile, { "data": data, "fingerprint": (netprint, tuple(shardprints)) }))
+		return jobs
+
 	def generate(self):
+		serial = self._nextserial()
+		jobs = [ ]
 		for network in self._controller.getnetworks():
-			if network.hasdns():
+			if not network.hasdns():
+				continue
+
+			sortedhosts = network.getsortedhosts()
+			netprint = network.getfingerprint()
+			jobs += self._forwardjobs(network, sortedhosts, serial)
+
+			# Every reverse zone shard only depends on names and addresses of
+			# its own hosts, so it is only recreated when these change
+			for (zone, hosts) in self._revshards(network, sortedhosts):
+				data = {
+					"network":		network,
+					"serial":		serial,
+					"zone":			zone,
+					"hostblocks":	self._hostblocks(hosts),
+				}
+				fingerprint = (netprint, zone, tuple((host.getname(), host.getip().get()) for host in hosts))
+				jobs.append(("rev.tmpl", "/etc/bind/" + zone + ".in-addr.arpa", { "data": data, "fingerprint": fingerprint }))
+
+			if network.getnet().getcidr() > 24:
+				# Classless zone, the parent /24 zone needs to delegate to it
 				data = {
-					"network":	network,
-					"serial":	time.strftime("%Y%m%d%H"),
+					"network":		network,
+					"zone":			network.getnet().getrevrepr(),
+					"parentzone":	IPv4Network("%s/24" % (IPv4Addr().setdecimal(network.getnet().getnet().get() & 0xffffff00))).getrevrepr(),
 				}
-				self._controller.instanciate("db.tmpl", "/etc/bind/db." + network.getname(), data = data)
-				self._controller.instanciate("rev.tmpl", "/etc/bind/" + network.getnet().getrevrepr() + ".in-addr.arpa", data = data)
+				jobs.append(("delegation.tmpl", "/etc/bind/" + data["zone"] + ".in-addr.arpa.delegation", { "data": data, "fingerprint": netprint }))
 
+		self._controller.instanciatemany(jobs)
@@ -0,0 +1,137 @@
+#	networkconfig - Generator for home router configuration and networks
+#	Copyright (C) 2012-2019 Johannes Bauer
+#
+#	This file is part of networkconfig.
+#
+#	networkconfig is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	networkconfig is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with networkconfig; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import json
+
+class KeaWriter():
+	"""Streams a Kea DHCPv4 configuration as JSON to a writable object
+	(usually the Mako context of the calling template). Reservations are
+	encoded in batches and written as they are produced, so memory use does
+	not depend on the number of hosts."""
+	_BATCHSIZE = 4096
+
+	def __init__(self, f, indent = 0):
+		self._f = f
+		self._indent = indent
+
+	@staticmethod
+	def subnetid(network):
+		"""Kea identifies subnets (and the leases within them) by a numeric id,
+		which is derived from the network address so that it stays stable when
+		other networks are added or removed."""
+		return min(max(network.getnet().getnet().get(), 1), 0xfffffffe)
+
+	def _subnet(self, network, reservationsinclude):
+		subnet = {
+			"id":		self.subnetid(network),
+			"subnet":	"%s/%d" % (network.getnet().getnet(), network.getnet().getcidr()),
+		}
+		if network.hasdhcp():
+			dhcp = network.getdhcp()
+			subnet["pools"] = [ { "pool": "%s - %s" % (dhcp.getrangefrom(), dhcp.getrangeto()) } ]
+			options = [ { "name": "domain-name", "data": network.getname() } ]
+			if dhcp.getbroadcast() is not None:
+				options.append({ "name": "broadcast-address", "data": str(dhcp.getbroadcast()) })
+			dnsservers = [ str(ip) for ip in dhcp.getdnsservers() ]
+			if len(dnsservers) > 0:
+				options.append({ "name": "domain-name-servers", "data": ", ".join(dnsservers) })
+			if dhcp.getrouter() is not None:
+				options.append({ "name": "routers", "data": str(dhcp.getrouter()) })
+			ntpservers = [ str(ip) for ip in dhcp.getntpservers() ]
+			if len(ntpservers) > 0:
+				options.append({ "name": "ntp-servers", "data": ", ".join(ntpservers) })
+			subnet["option-data"] = options
+			if dhcp.getleasetimedefault() is not None:
+				subnet["valid-lifetime"] = dhcp.getleasetimedefault()
+			if dhcp.getleasetimemax() is not None:
+				subnet["max-valid-lifetime"] = dhcp.getleasetimemax()
+			if dhcp.getpxefilename() is not None:
+				subnet["boot-file-name"] = dhcp.getpxefilename()
+			if dhcp.getpxenext() is not None:
+				subnet["next-server"] = str(dhcp.getpxenext())
+
+		# Encode everything but the reservations, which are streamed into the
+		# still open object afterwards
+		encoded = json.dumps(subnet, indent = "\t")
+		self._f.write("\t\t\t" + encoded[:-2].replace("\n", "\n\t\t\t") + ",\n")
+		self._f.write("\t\t\t\t\"reservations\": ")
+		if reservationsinclude is not None:
+			self._f.write("<?include \"%s\"?>\n" % (reservationsinclude))
+		else:
+			self._indent = 4
+			self.reservations(network.getsortedhosts())
+			self._indent = 0
+		self._f.write("\t\t\t}")
+
+	def config(self, networks, reservationsincludes):
+		"""Writes the complete configuration for the given networks.
+		reservationsincludes maps network names to include file names for
+		networks whose reservations are kept in a separate file."""
+		self._f.write("{\n\t\"Dhcp4\": {\n\t\t\"authoritative\": true,\n\t\t\"subnet4\": [\n")
+		for (index, network) in enumerate(sorted(networks)):
+			if index > 0:
+				self._f.write(",\n")
+			self._subnet(network, reservationsincludes.get(network.getname()))
+		self._f.write("\n\t\t]\n\t}\n}\n")
+
+	def reservations(self, hosts):
+		"""Writes a JSON array with one reservation per host."""
+		indent = "\t" * self._indent
+		self._f.write("[\n")
+		hosts = iter(hosts)
+		first = True
+		while True:
+			batch = [ ]
+			for host in hosts:
+				batch.append("%s\t{ \"hw-address\": \"%s\", \"ip-address\": \"%s\", \"hostname\": %s }" % (indent, host.getmac(), host.getip(), json.dumps(host.getname())))
+				if len(batch) >= self._BATCHSIZE:
+					break
+			if len(batch) == 0:
+				break
+			if not first:
+				self._f.write(",\n")
+			self._f.write(",\n".join(batch))
+			first = False
+		self._f.write("\n%s]\n" % (indent))
+
+class Generator():
+	# Reservations of subnets with more hosts than this are written to a
+	# separate include file per subnet (None disables splitting)
+	_INCLUDE_THRESHOLD = 1000
+
+	def __init__(self, controller):
+		self._controller = controller
+
+	def generate(self):
+		# The main configuration always covers all networks, but only the
+		# reservation files of selected networks are recreated
+		selected = set(self._controller.getnetworks())
+		includes = { }
+		jobs = [ ]
+		if self._INCLUDE_THRESHOLD is not None:
+			for network in self._controller.getallnetworks():
+				if network.gethostcount() > self._INCLUDE_THRESHOLD:
+					includes[network.getname()] = "/etc/kea/reservations-%s.json" % (network.getname())
+					if network in selected:
+						fingerprint = (network.getfingerprint(), tuple(sorted((host.getip().get(), host.getname(), host.getmac().cmpkey()) for host in network)))
+						jobs.append(("reservations.tmpl", includes[network.getname()], { "data": { "network": network, "KeaWriter": KeaWriter }, "fingerprint": fingerprint }))
+		jobs.append(("kea-dhcp4.tmpl", "/etc/kea/kea-dhcp4.conf", { "data": { "includes": includes, "KeaWriter": KeaWriter } }))
+		self._controller.instanciatemany(jobs)
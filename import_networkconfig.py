@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+import os
+import sys
+import argparse
+from ConfigModel import ConfigModel
+from LeaseImporter import LeaseImporter
+
+parser = argparse.ArgumentParser(prog = sys.argv[0], description = "Turn the leases of ISC dhcpd lease files into fixed host entries of a networkconfig XML file", add_help = True)
+parser.add_argument("infile", metavar = "filename", type = str, help = "Input XML filename")
+parser.add_argument("leasefiles", metavar = "leasefile", type = str, nargs = "+", help = "dhcpd.leases file(s) to import")
+parser.add_argument("-outfile", metavar = "filename", type = str, help = "Write the resulting configuration to this file (default is to update the input file)")
+parser.add_argument("-states", metavar = "states", type = str, help = "Comma-separated list of binding states of the leases to import (default is %(default)s)", default = ",".join(LeaseImporter._DEFAULT_STATES))
+parser.add_argument("-dryrun", action = "store_true", help = "Only show which hosts would be added, do not write anything")
+args = parser.parse_args(sys.argv[1:])
+
+try:
+	importer = LeaseImporter(ConfigModel.fromfile(args.infile), args.states.split(","))
+	for leasefile in args.leasefiles:
+		importer.readleasefile(leasefile)
+	hosts = importer.gethosts()
+except Exception as e:
+	print("%s: %s" % (sys.argv[0], str(e)), file = sys.stderr)
+	sys.exit(1)
+
+for (mac, ip, reason) in importer.getskipped():
+	print("skipped %s (%s): %s" % (mac, ip, reason), file = sys.stderr)
+for (mac, leasedip, ip) in importer.getreassigned():
+	print("reassigned %s: leased %s is not a fixed address, using %s" % (mac, leasedip, ip), file = sys.stderr)
+for host in hosts:
+	print("adding %s <%s, %s>" % (host["name"], host["ip"], host["mac"]), file = sys.stderr)
+print("%d leases read, %d hosts added, %d skipped" % (importer.getleasecount(), len(hosts), len(importer.getskipped())), file = sys.stderr)
+if args.dryrun or (len(hosts) == 0):
+	sys.exit(0)
+
+# The result is validated before it replaces the output file
+outfile = args.outfile or args.infile
+tmpfile = outfile + ".tmp"
+try:
+	with open(args.infile) as inf, open(tmpfile, "w") as outf:
+		importer.writeconfig(inf, outf)
+	ConfigModel.fromfile(tmpfile)
+except Exception as e:
+	if os.path.exists(tmpfile):
+		os.unlink(tmpfile)
+	print("%s: %s" % (sys.argv[0], str(e)), file = sys.stderr)
+	sys.exit(1)
+os.replace(tmpfile, outfile)
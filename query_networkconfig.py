@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+import sys
+import argparse
+from ConfigModel import ConfigModel
+from ConfigIndex import ConfigIndex
+
+parser = argparse.ArgumentParser(prog = sys.argv[0], description = "Answer lookups about a networkconfig XML file", add_help = True, formatter_class = argparse.RawDescriptionHelpFormatter, epilog = """
+queries:
+  name <hostname>     all hosts with this hostname
+  fqdn <name.net>     host with this fully qualified name
+  ip <address>        host with this IP address
+  mac <address>       host with this MAC address
+  net <address>       network containing this IP address
+  free <network>      free address ranges (outside the DHCP range)
+  next <network>      lowest free address
+
+Each query is given as one argument (e.g. "mac 2e:45:48:6c:fb:9b"). Without
+query arguments, queries are read from stdin, one per line.""")
+parser.add_argument("infile", metavar = "filename", type = str, help = "Input XML filename")
+parser.add_argument("queries", metavar = "query", type = str, nargs = "*", help = "Query to answer, see below")
+args = parser.parse_args(sys.argv[1:])
+
+index = ConfigIndex(ConfigModel.fromfile(args.infile))
+
+def hoststr(host):
+	if host is None:
+		return "not found"
+	return "%s %s %s" % (index.fqdn(host), host.getip(), host.getmac())
+
+def answer(query):
+	(cmd, _, arg) = query.strip().partition(" ")
+	arg = arg.strip()
+	if cmd == "name":
+		hosts = index.byname(arg)
+		if len(hosts) == 0:
+			return "not found"
+		return ", ".join(hoststr(host) for host in hosts)
+	elif cmd == "fqdn":
+		return hoststr(index.byfqdn(arg))
+	elif cmd == "ip":
+		return hoststr(index.byip(arg))
+	elif cmd == "mac":
+		return hoststr(index.bymac(arg))
+	elif cmd == "net":
+		network = index.networkof(arg)
+		return "not found" if (network is None) else "%s %s" % (network.getname(), network.getnet())
+	elif cmd in [ "free", "next" ]:
+		if index.getnetwork(arg) is None:
+			return "error: no such network"
+		if cmd == "next":
+			ip = index.nextfree(arg)
+			return "none" if (ip is None) else str(ip)
+		ranges = index.freeranges(arg)
+		if len(ranges) == 0:
+			return "none"
+		return ", ".join(str(first) if (first == last) else "%s-%s" % (first, last) for (first, last) in ranges)
+	else:
+		return "error: unknown query"
+
+def answerall(queries):
+	for query in queries:
+		if query.strip() == "":
+			continue
+		try:
+			result = answer(query)
+		except Exception as e:
+			result = "error: %s" % (str(e))
+		print("%s\t%s" % (query.strip(), result))
+
+if len(args.queries) > 0:
+	answerall(args.queries)
+else:
+	answerall(sys.stdin)